@@ -1,3 +1,4 @@
+import heapq
 import streamlit as st
 import pandas as pd
 from sqlalchemy import create_engine
@@ -38,6 +39,10 @@ def get_time_congestion_factor(hour):
     else:  # Regular daytime
         return 1.0
 
+def get_traffic_column(hour):
+    """Traffic_Flow column used for an hour of the day"""
+    return 'Morning_Peak' if 5 <= hour < 12 else 'Evening_Peak'
+
 def build_graph(roads_df, traffic_df, time_hour, selected_strategy="none", assume_two_way=False):
     G = nx.DiGraph()
     
@@ -45,7 +50,7 @@ def build_graph(roads_df, traffic_df, time_hour, selected_strategy="none", assum
     time_factor = get_time_congestion_factor(time_hour)
     
     # Select traffic column based on time
-    traffic_col = 'Morning_Peak' if 5 <= time_hour < 12 else 'Evening_Peak'
+    traffic_col = get_traffic_column(time_hour)
     
     # Create a traffic lookup dictionary
     traffic_dict = {(row['FromID'], row['ToID']): row[traffic_col] for idx, row in traffic_df.iterrows()}
@@ -135,77 +140,207 @@ def build_graph(roads_df, traffic_df, time_hour, selected_strategy="none", assum
     
     return G
 
+def segment_minutes(distance, congestion):
+    """Travel time in minutes over one road at 60 km/h reduced by congestion"""
+    speed = 60 / (1 + 2 * congestion)  # km/h
+    return (distance / speed) * 60
+
+def fifo_profile(profile):
+    """Raise hourly travel times so that leaving later never arrives earlier (FIFO)
+
+    Between hourly values the travel time is linear, so arrival is non-decreasing in the
+    departure minute exactly when no value drops by more than 60 minutes from the hour
+    before. Raising a value to that bound means waiting for the earlier arrival, which
+    is what a driver would do, and keeps label-setting Dijkstra exact.
+    """
+    profile = list(profile)
+    changed = True
+    while changed:  # a raise at hour 0 can carry on around the day once more
+        changed = False
+        for hour in range(24):
+            floor = profile[hour] - 60
+            if profile[(hour + 1) % 24] < floor:
+                profile[(hour + 1) % 24] = floor
+                changed = True
+    return profile
+
+def build_time_dependent_graph(roads_df, traffic_df, selected_strategy="none", assume_two_way=False):
+    """Road graph whose edges carry 24 hourly congestion and travel-time values, built once per data load"""
+    # hours only differ by traffic column and congestion factor, so a handful of builds covers the day
+    hourly_graphs = {}
+    for hour in range(24):
+        key = (get_traffic_column(hour), get_time_congestion_factor(hour))
+        if key not in hourly_graphs:
+            hourly_graphs[key] = build_graph(roads_df, traffic_df, hour, selected_strategy, assume_two_way)
+    hours = [hourly_graphs[(get_traffic_column(h), get_time_congestion_factor(h))] for h in range(24)]
+
+    TG = nx.DiGraph()
+    for u, v, data in hours[0].edges(data=True):
+        congestion = [G[u][v]['congestion'] for G in hours]
+        TG.add_edge(u, v, distance=data['distance'], congestion=congestion,
+                    profile=fifo_profile(segment_minutes(data['distance'], c) for c in congestion))
+    return TG
+
+def profile_travel_time(profile, minute):
+    """Travel time for entering an edge at a minute of the day, linear between hourly values"""
+    hour, fraction = divmod((minute % 1440) / 60, 1)
+    hour = int(hour)
+    return profile[hour] + (profile[(hour + 1) % 24] - profile[hour]) * fraction
+
+def time_dependent_shortest_path(TG, source, target, departure_minute, closed_edges=()):
+    """Earliest-arrival Dijkstra over hourly travel-time profiles, returns (path, arrival_minute)"""
+    closed = set(closed_edges)
+    arrival = {source: departure_minute}
+    previous = {}
+    settled = set()
+    heap = [(departure_minute, source)]
+    while heap:
+        minute, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u == target:
+            path = [u]
+            while path[-1] in previous:
+                path.append(previous[path[-1]])
+            return path[::-1], minute
+        for v, data in TG[u].items():
+            if v in settled or (u, v) in closed:
+                continue
+            # profiles are FIFO (see fifo_profile), so the earliest arrival at u is always best
+            next_minute = minute + profile_travel_time(data['profile'], minute)
+            if next_minute < arrival.get(v, float('inf')):
+                arrival[v] = next_minute
+                previous[v] = u
+                heapq.heappush(heap, (next_minute, v))
+    return None, None
+
+@st.cache_resource(ttl=3600)
+def get_graph(roads_df, traffic_df, time_hour, selected_strategy):
+    """Shared frozen graph per hour and strategy, routed through views instead of copies"""
+    return nx.freeze(build_graph(roads_df, traffic_df, time_hour, selected_strategy))
+
+@st.cache_resource(ttl=3600)
+def get_time_dependent_graph(roads_df, traffic_df, selected_strategy):
+    return build_time_dependent_graph(roads_df, traffic_df, selected_strategy)
+
 def get_coordinates_map(neighborhoods_df, facilities_df):
     """Create a lookup dictionary of coordinates for all locations"""
-    coords = {}
-    for idx, row in neighborhoods_df.iterrows():
-        coords[str(row['ID'])] = {
-            'name': row['Name'],
-            'lat': float(row['Y_coordinate']),
-            'lon': float(row['X_coordinate'])
-        }
-    for idx, row in facilities_df.iterrows():
-        coords[str(row['ID'])] = {
-            'name': row['Name'],
-            'lat': float(row['Y_coordinate']),
-            'lon': float(row['X_coordinate'])
-        }
-    return coords
-
-def find_multiple_paths(G, source, target, max_paths=2):
-    """Find multiple diverse paths between source and target"""
-    paths = []
-    
-    # Find the shortest path first
+    nodes = pd.concat([neighborhoods_df, facilities_df], ignore_index=True)
+    return {
+        node_id: {'name': name, 'lat': lat, 'lon': lon}
+        for node_id, name, lat, lon in zip(nodes['ID'].astype(str), nodes['Name'],
+                                           nodes['Y_coordinate'].astype(float).tolist(),
+                                           nodes['X_coordinate'].astype(float).tolist())
+    }
+
+def path_weight(G, path):
+    """Total edge weight along a path"""
+    return sum(G[u][v]['weight'] for u, v in zip(path[:-1], path[1:]))
+
+def path_dissimilarity(G, path, other):
+    """Share of a path's weight that does not run over edges of the other path"""
+    total = path_weight(G, path)
+    if total == 0:
+        return 0.0
+    other_edges = set(zip(other[:-1], other[1:]))
+    shared = sum(G[u][v]['weight'] for u, v in zip(path[:-1], path[1:]) if (u, v) in other_edges)
+    return 1 - shared / total
+
+def find_multiple_paths(G, source, target, max_paths=2, min_dissimilarity=0.3, closed_edges=(), max_candidates=50):
+    """Find multiple diverse paths between source and target
+    
+    Yen's k-shortest loopless paths over views of the shared graph. A candidate is
+    kept only if it is at least min_dissimilarity different from every kept path.
+    """
+    G_open = nx.restricted_view(G, [], [edge for edge in closed_edges if G.has_edge(*edge)])
+    
+    # Exact remaining cost to the target from one reverse Dijkstra. Spur searches only
+    # remove nodes and edges, so it stays an admissible A* heuristic for every one of them
     try:
-        main_path = nx.shortest_path(G, source=source, target=target, weight='weight')
-        main_length = nx.shortest_path_length(G, source=source, target=target, weight='weight')
-        paths.append((main_path, main_length))
-        
-        # Try to find an alternative route
-        if max_paths > 1:
-            # Create a copy of the graph for modifications
-            G_temp = G.copy()
-            
-            # Penalize edges from the first path
-            for i in range(len(main_path) - 1):
-                u, v = main_path[i], main_path[i+1]
-                if G_temp.has_edge(u, v):
-                    # Increase the weight to discourage reusing this edge
-                    G_temp[u][v]['weight'] *= 1.5
-            
-            # Find the alternative path
+        to_target = nx.single_source_dijkstra_path_length(G_open.reverse(copy=False), target, weight='weight')
+    except nx.NodeNotFound:
+        return []
+    if source not in to_target:
+        return []
+    heuristic = lambda u, _: to_target.get(u, float('inf'))
+    
+    main_path = nx.astar_path(G_open, source, target, heuristic=heuristic, weight='weight')
+    found = [main_path]
+    paths = [(main_path, to_target[source])]
+    candidates = []
+    seen = {tuple(main_path)}
+    
+    while len(paths) < max_paths and len(found) < max_candidates:
+        last_path = found[-1]
+        for i in range(len(last_path) - 1):
+            root = last_path[:i + 1]
+            # Block the next edge of every found path sharing this root, and the root itself
+            blocked_edges = [(p[i], p[i + 1]) for p in found if p[:i + 1] == root]
+            G_spur = nx.restricted_view(G_open, root[:-1], blocked_edges)
             try:
-                alt_path = nx.shortest_path(G_temp, source=source, target=target, weight='weight')
-                # Calculate the length using original edge weights
-                alt_length = sum(G[alt_path[i]][alt_path[i+1]]['weight'] for i in range(len(alt_path)-1))
-                
-                # Only include if sufficiently different
-                if len(set(alt_path) - set(main_path)) > 1:
-                    paths.append((alt_path, alt_length))
+                spur_path = nx.astar_path(G_spur, root[-1], target, heuristic=heuristic, weight='weight')
             except nx.NetworkXNoPath:
-                pass
-    except nx.NetworkXNoPath:
-        return []
+                continue
+            path = root[:-1] + spur_path
+            if tuple(path) not in seen:
+                seen.add(tuple(path))
+                heapq.heappush(candidates, (path_weight(G, path), path))
+        
+        if not candidates:
+            break
+        length, path = heapq.heappop(candidates)
+        found.append(path)
+        if all(path_dissimilarity(G, path, kept) >= min_dissimilarity for kept, _ in paths):
+            paths.append((path, length))
     
     return paths
 
 def shortest_path_with_closed(G, source, target, closed_edges):
     """Find shortest path avoiding closed edges"""
-    # Remove closed edges
-    G_temp = G.copy()
-    for edge in closed_edges:
-        if G_temp.has_edge(*edge):
-            G_temp.remove_edge(*edge)
+    # Hide closed edges behind a read-only view of the shared graph
+    G_open = nx.restricted_view(G, [], [edge for edge in closed_edges if G.has_edge(*edge)])
     
-    # Try to find a path
+    # Path and length from a single Dijkstra run
     try:
-        path = nx.shortest_path(G_temp, source=source, target=target, weight='weight')
-        length = nx.shortest_path_length(G_temp, source=source, target=target, weight='weight')
+        length, path = nx.single_source_dijkstra(G_open, source, target, weight='weight')
         return path, length
     except nx.NetworkXNoPath:
         return None, None
 
+def nearest_reachable_facilities(G, source, facility_ids, closed_edges=(), k=1):
+    """Rank the k facilities closest to the source by network weight, honoring closed roads
+    
+    A single Dijkstra from the source that stops once k facility nodes are settled.
+    Returns a list of (facility_id, path, length).
+    """
+    facility_ids = {str(f) for f in facility_ids} - {str(source)}
+    closed = set(closed_edges)
+    distances = {source: 0}
+    previous = {}
+    settled = set()
+    heap = [(0, source)]
+    ranked = []
+    while heap and len(ranked) < k:
+        dist, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        if str(u) in facility_ids:
+            path = [u]
+            while path[-1] in previous:
+                path.append(previous[path[-1]])
+            ranked.append((str(u), path[::-1], dist))
+        for v, data in G[u].items():
+            if v in settled or (u, v) in closed:
+                continue
+            new_dist = dist + data['weight']
+            if new_dist < distances.get(v, float('inf')):
+                distances[v] = new_dist
+                previous[v] = u
+                heapq.heappush(heap, (new_dist, v))
+    return ranked
+
 def format_path(coords_map, path):
     """Format path for visualization"""
     route = []
@@ -224,13 +359,7 @@ def calculate_eta(path, G):
     for i in range(len(path) - 1):
         if G.has_edge(path[i], path[i+1]):
             edge_data = G[path[i]][path[i+1]]
-            distance = edge_data['distance']  # in km
-            congestion = edge_data['congestion']
-            
-            # Base speed: 60 km/h, reduced by congestion
-            speed = 60 / (1 + 2 * congestion)  # km/h
-            time_minutes = (distance / speed) * 60
-            total_time_minutes += time_minutes
+            total_time_minutes += segment_minutes(edge_data['distance'], edge_data['congestion'])
     
     return total_time_minutes
 
@@ -391,6 +520,7 @@ with sidebar_col:
     elif time_setting == "morning_rush": time_hour = 8
     elif time_setting == "evening_rush": time_hour = 17
     else: time_hour = 14
+    departure_minute = time_hour * 60 + (current_time.minute if time_setting == "current" else 0)
     
     congestion_factor = get_time_congestion_factor(time_hour)
     traffic_status = ("Heavy traffic" if congestion_factor >= 1.5 else "Moderate traffic" if congestion_factor >= 1.0 else "Light traffic")
@@ -410,6 +540,17 @@ with sidebar_col:
         help="Apply a specific traffic management strategy to observe its potential impact.",
         key="planner_congestion_strategy_select"
     )
+    num_alternatives = st.slider(
+        "Alternative routes",
+        min_value=0, max_value=4, value=2,
+        help="Show up to this many alternatives that differ by at least 30% from each other.",
+        key="planner_num_alternatives"
+    )
+    time_aware_routing = st.checkbox(
+        "Time-aware routing",
+        help="Price each road at the time you reach it, so trips crossing rush-hour boundaries are estimated correctly.",
+        key="planner_time_aware"
+    )
     
     st.markdown("<div class='sidebar-header'>Road Closures</div>", unsafe_allow_html=True)
     road_options_planner = []
@@ -461,47 +602,37 @@ with main_col:
             st.warning("⚠️ Please select different starting and destination points")
         else:
             with st.spinner("Finding the best route..."):
-                G = build_graph(roads_df, traffic_df, time_hour, selected_strategy_planner)
-                path, length = shortest_path_with_closed(G, source, target, closed_roads_selected_planner)
+                G = get_graph(roads_df, traffic_df, time_hour, selected_strategy_planner)
+                arrival_minute = None
+                if time_aware_routing:
+                    TG = get_time_dependent_graph(roads_df, traffic_df, selected_strategy_planner)
+                    path, arrival_minute = time_dependent_shortest_path(TG, source, target, departure_minute, closed_roads_selected_planner)
+                    length = path_weight(G, path) if path else None
+                else:
+                    path, length = shortest_path_with_closed(G, source, target, closed_roads_selected_planner)
                 alt_paths = [] 
             
             if path is None:
-                st.info("ℹ️ Direct route not found. Trying to find a route to the nearest major facility to your destination...")
-                facilities_nodes = {str(row['ID']): row for idx, row in facilities_df.iterrows()}
-                if not facilities_df.empty:
-                    target_coords = coords_map.get(str(target))
-                    if not target_coords:
-                        st.error("Could not get coordinates for the original target to find nearest facility.")
-                        st.error("❌ No route found. The destination may be unreachable. This could be due to selected road closures or missing road segments in the database for this specific journey.")
+                st.info("ℹ️ Direct route not found. Trying to find a route to the nearest reachable major facility...")
+                if not facilities_df.empty and source in G:
+                    ranked_hubs = nearest_reachable_facilities(G, source, facilities_df['ID'], closed_roads_selected_planner, k=3)
+                    if ranked_hubs:
+                        hub_id, path, length = ranked_hubs[0]
+                        hub_name = coords_map.get(hub_id, {}).get('name', hub_id)
+                        st.success(f"✅ Could not route directly to {coords_map[target]['name']}. Instead, found route to nearest major facility: **{hub_name}**.")
+                        st.markdown(f"From **{hub_name}**, you will need to find local transport to your original destination: **{coords_map[target]['name']}**.")
+                        if len(ranked_hubs) > 1:
+                            st.caption("Other reachable facilities: " + ", ".join(f"{coords_map.get(h, {}).get('name', h)} ({l:.1f})" for h, _, l in ranked_hubs[1:]))
                     else:
-                        hubs_with_dist = []
-                        for idx, fac_row in facilities_df.iterrows():
-                            fac_id = str(fac_row['ID'])
-                            fac_coords = coords_map.get(fac_id)
-                            if fac_coords:
-                                dist_sq = (fac_coords['lon'] - target_coords['lon'])**2 + (fac_coords['lat'] - target_coords['lat'])**2
-                                hubs_with_dist.append({'id': fac_id, 'name': fac_row['Name'], 'dist_sq_to_target': dist_sq})
-                        sorted_hubs = sorted(hubs_with_dist, key=lambda x: x['dist_sq_to_target'])
-                        found_hub_route = False
-                        for hub_candidate in sorted_hubs:
-                            hub_id_str = str(hub_candidate['id'])
-                            if hub_id_str not in G: continue
-                            if hub_id_str == str(source): continue
-                            hub_path, hub_length = shortest_path_with_closed(G, source, hub_id_str, closed_roads_selected_planner)
-                            if hub_path:
-                                st.success(f"✅ Could not route directly to {coords_map[target]['name']}. Instead, found route to nearest major facility: **{hub_candidate['name']}**.")
-                                path = hub_path
-                                length = hub_length
-                                st.markdown(f"From **{hub_candidate['name']}**, you will need to find local transport to your original destination: **{coords_map[target]['name']}**.")
-                                found_hub_route = True
-                                break
-                        if not found_hub_route:
-                            st.error("❌ No route found. Tried direct path and routing to nearest major facilities without success. This could be due to road closures or missing/disconnected road segments in the database.")
+                        st.error("❌ No route found. Tried direct path and routing to nearest major facilities without success. This could be due to road closures or missing/disconnected road segments in the database.")
                 else:
                     st.error("❌ No facilities data available to attempt routing to a nearby hub. Direct route not found.")
             
+            if path and num_alternatives > 0:
+                alt_paths = [p for p, _ in find_multiple_paths(G, path[0], path[-1], 1 + num_alternatives, closed_edges=closed_roads_selected_planner)[1:]]
+            
             if path:
-                eta_minutes = calculate_eta(path, G)
+                eta_minutes = arrival_minute - departure_minute if arrival_minute is not None else calculate_eta(path, G)
                 arrival_time = datetime.now() + timedelta(minutes=eta_minutes)
                 metrics_cols = st.columns(3)
                 with metrics_cols[0]: st.markdown(f'''<div class="metric"><div class="metric-value">{length:.1f} km</div><div class="metric-label">Distance</div></div>''', unsafe_allow_html=True)
@@ -527,6 +658,9 @@ with main_col:
                         else: p_coord['color'] = [41, 128, 185]
                     points_layer = pdk.Layer("ScatterplotLayer",data=route_coords,get_position='[lon, lat]',get_fill_color='color',get_radius=150,pickable=True,stroked=True,get_line_color=[255,255,255],get_line_width=2)
                     alt_route_layers = [] 
+                    for alt_path in alt_paths:
+                        alt_coords = [(c['lon'], c['lat']) for c in format_path(coords_map, alt_path)]
+                        alt_route_layers.append(pdk.Layer("PathLayer", data=[{"path": alt_coords}], get_path="path", get_color=[120, 120, 120, 180], width_scale=10, width_min_pixels=3, pickable=False))
                     general_congestion_map_data = []
                     if G:
                         for u_node, v_node, edge_data in G.edges(data=True):
@@ -544,6 +678,8 @@ with main_col:
                     st.markdown('<div class="route-info">', unsafe_allow_html=True)
                     st.markdown(f"#### Route: {coords_map[source]['name']} to {coords_map[target]['name']}")
                     st.markdown("**Path:** " + " → ".join([coords_map.get(str(node), {}).get('name', str(node)) for node in path]))
+                    for i_alt, alt_path in enumerate(alt_paths, start=1):
+                        st.markdown(f"**Alternative {i_alt}** ({int(calculate_eta(alt_path, G))} min): " + " → ".join([coords_map.get(str(node), {}).get('name', str(node)) for node in alt_path]))
                     st.markdown('</div>', unsafe_allow_html=True)
 
                 with st.expander("Traffic Simulation & Analytics Insight", expanded=False):
@@ -556,14 +692,14 @@ with main_col:
                         st.caption("The metrics below compare the selected route with and without the chosen congestion reduction strategy.")
                         
                         # Calculate route metrics without strategy
-                        G_analytics_no_strategy = build_graph(roads_df, traffic_df, time_hour, selected_strategy="none")
+                        G_analytics_no_strategy = get_graph(roads_df, traffic_df, time_hour, "none")
                         path_ns, len_ns = shortest_path_with_closed(G_analytics_no_strategy, source, target, closed_roads_selected_planner)
                         eta_ns = calculate_eta(path_ns, G_analytics_no_strategy) if path_ns else 0
                         avg_congestion_ns = calculate_average_route_congestion(path_ns, G_analytics_no_strategy) if path_ns else 0
 
                         # Calculate route metrics with selected strategy
                         strategy_name = strategy_options.get(selected_strategy_planner, "Selected Strategy")
-                        G_analytics_with_strategy = build_graph(roads_df, traffic_df, time_hour, selected_strategy=selected_strategy_planner)
+                        G_analytics_with_strategy = get_graph(roads_df, traffic_df, time_hour, selected_strategy_planner)
                         path_ws, len_ws = shortest_path_with_closed(G_analytics_with_strategy, source, target, closed_roads_selected_planner)
                         eta_ws = calculate_eta(path_ws, G_analytics_with_strategy) if path_ws else 0
                         avg_congestion_ws = calculate_average_route_congestion(path_ws, G_analytics_with_strategy) if path_ws else 0
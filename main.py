@@ -2,17 +2,28 @@ import streamlit as st
 import pandas as pd
 import networkx as nx
 from utils.database import load_data, load_traffic_data
-from utils.helpers import get_coordinates
+from utils.node_registry import NodeRegistry
 from algorithms.graph_algorithms import (
-    build_graph, 
     a_star, 
     compute_mst, 
-    build_combined_graph,
-    identify_transfer_points
+    build_combined_graph
 )
+from algorithms.graph_cache import GraphCache
 from visualization.map_visualization import prepare_road_data, prepare_lines_df, visualize_map
 from transit.transit_optimizer import TransitOptimizer
 
+NEAREST_HOSPITAL = "nearest"
+
+@st.cache_resource
+def get_graph_cache():
+    """Graph cache shared by every session in this process"""
+    return GraphCache()
+
+@st.cache_resource
+def get_transit_optimizer(bus_routes, metro_lines, demand_data, traffic_flow, neighborhoods, facilities):
+    """Transit optimizer built once per data load instead of on every slider change"""
+    return TransitOptimizer(bus_routes, metro_lines, demand_data, traffic_flow, neighborhoods, facilities)
+
 def main():
     st.set_page_config(layout="wide")
     
@@ -21,14 +32,11 @@ def main():
      metro_lines, bus_routes, demand_data, traffic_flow) = load_data()
     
     global locations
-    locations = {}
-    for _, row in neighborhoods.iterrows():
-        locations[str(row['id']).strip()] = (float(row['x_coordinate']), float(row['y_coordinate']))
-    for _, row in facilities.iterrows():
-        locations[str(row['id']).strip()] = (float(row['x_coordinate']), float(row['y_coordinate']))
+    registry = NodeRegistry.from_tables(neighborhoods, facilities)
+    locations = registry.locations()
 
     # Prepare road data for visualization
-    roads_df = prepare_road_data(existing_roads, neighborhoods, facilities, locations)
+    roads_df = prepare_road_data(existing_roads, registry)
 
     # Create tabs for different functionalities
     tab1, tab2, tab3 = st.tabs(["Emergency Routing", "Network Optimization", "Transit Planning"])
@@ -50,6 +58,19 @@ def main():
         )
         
         emergency_mode = st.sidebar.checkbox("Emergency Mode (Priority Routing)", True)
+        routing_engine = st.sidebar.selectbox(
+            "Routing Engine",
+            ["A*", "A* + Landmarks (ALT)", "Contraction Hierarchies"],
+            help="""
+            A*: no preprocessing
+            ALT: landmark travel times per time period give tighter A* bounds
+            Contraction Hierarchies: one-off preprocessing per time period, fastest repeated queries
+            """
+        )
+        bidirectional = st.sidebar.checkbox(
+            "Bidirectional Search", False,
+            help="Search from the origin and the hospital at once (A* engines only)"
+        )
         
         # Create mappings for node names
         node_names = {}
@@ -73,25 +94,41 @@ def main():
         )
         hospital = st.sidebar.selectbox(
             "Destination Hospital",
-            options=hospitals,
-            format_func=lambda x: node_names.get(x, x)
+            options=[NEAREST_HOSPITAL] + hospitals,
+            format_func=lambda x: "Nearest Hospital (fastest to reach)" if x == NEAREST_HOSPITAL else node_names.get(x, x)
         )
 
         if st.sidebar.button("Calculate Emergency Route"):
             with st.spinner("Optimizing route..."):
-                road_graph = build_graph(
+                graph_cache = get_graph_cache()
+                road_graph = graph_cache.get(
                     existing_roads, 
                     traffic_flow, 
                     time_period,
                     potential_roads,
                     emergency_mode
                 )
-                path = a_star(road_graph, start, hospital, locations)
+                if hospital == NEAREST_HOSPITAL:
+                    nearest = graph_cache.get_nearest_facilities(time_period, emergency_mode, hospitals)
+                    path, travel_time = nearest.path(start)
+                    if path:
+                        st.sidebar.info(f"Nearest hospital: {node_names.get(path[-1], path[-1])}")
+                elif routing_engine == "Contraction Hierarchies":
+                    hierarchy = graph_cache.get_hierarchy(time_period, emergency_mode)
+                    path, travel_time = hierarchy.query(start, hospital)
+                else:
+                    landmarks = None
+                    if routing_engine == "A* + Landmarks (ALT)":
+                        landmarks = graph_cache.get_landmarks(time_period, emergency_mode, seeds=facilities['id'])
+                    search_stats = {}
+                    path, travel_time = a_star(road_graph, start, hospital, locations, landmarks=landmarks,
+                                               stats=search_stats, bidirectional=bidirectional)
+                    st.sidebar.caption(f"Nodes settled: {search_stats.get('settled', 0)}")
+                cache_stats = graph_cache.stats()
+                st.sidebar.caption(f"Graph cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
             
             if path:
                 try:
-                    travel_time = sum(road_graph[u][v] for u,v in zip(path[:-1], path[1:]))
-                    
                     minutes = travel_time * 60
                     st.success(f"⏱️ Estimated Emergency Response Time: {minutes:.1f} minutes")
                     
@@ -134,6 +171,8 @@ def main():
             index=0
         )
 
+        min_connections = st.sidebar.slider("Min Facility Connections", 1, 4, 2)
+
         # Build combined graph including potential roads
         combined_graph = build_combined_graph(existing_roads, potential_roads, neighborhoods, facilities)
 
@@ -142,8 +181,8 @@ def main():
         st.sidebar.info(f"Standard Network Total Cost: {standard_total_cost:.2f} units")
 
         if view_type == "Optimized Network (MST)":
-            mst = compute_mst(combined_graph)
-            mst_edges_df = prepare_lines_df(mst.edges(data=True), neighborhoods, facilities)
+            mst = compute_mst(combined_graph, min_connections)
+            mst_edges_df = prepare_lines_df(mst.edges(data=True), registry)
             
             total_cost = sum(float(d['weight']) for _, _, d in mst.edges(data=True))
             st.sidebar.success(f"Optimized Network Total Cost: {total_cost:.2f} units")
@@ -181,11 +220,11 @@ def main():
         max_transfers = st.sidebar.slider("Max Transfers", 1, 3, 2)
 
         # Initialize transit optimizer
-        optimizer = TransitOptimizer(bus_routes, metro_lines, demand_data, traffic_flow, neighborhoods, facilities)
+        optimizer = get_transit_optimizer(bus_routes, metro_lines, demand_data, traffic_flow, neighborhoods, facilities)
         
         # Get transfer points and optimize routes
-        transfer_points, _ = identify_transfer_points(bus_routes, metro_lines, neighborhoods, facilities)
-        optimized_routes = optimizer.optimize_routes()
+        transfer_points = optimizer.transfer_points
+        optimized_routes = optimizer.optimize_routes(max_transfers=max_transfers)
         
         visualize_map(
             neighborhoods, 
@@ -203,10 +242,34 @@ def main():
                 st.write(f"""
                 Route {route['fromid']} → {route['toid']}
                 - 🕒 Estimated Time: {route['estimated_time']:.1f} minutes
+                - 🔁 Transfers: {route['transfers']}
                 - 👥 Demand: {route['demand']} passengers
                 - 🚏 Path: {' → '.join(route['path'])}
                 """)
         
+        if st.checkbox("Route all demand pairs"):
+            all_routes = optimizer.optimize_all_routes(max_transfers)
+            served = all_routes['estimated_time'] < float('inf')
+            st.write(f"Routed {served.sum()} of {len(all_routes)} demand pairs, "
+                     f"{all_routes['passenger_minutes'].sum() / 60:,.0f} passenger-hours per day")
+            st.dataframe(all_routes.assign(path=all_routes['path'].str.join(' → ')))
+            _, segment_loads = optimizer.assign_demand()
+            st.write("Busiest line segments")
+            st.dataframe(segment_loads.nlargest(10, 'passengers'))
+        
+        # Journey planner on the line-aware transit network
+        st.subheader("Journey Planner")
+        stops = optimizer.raptor.stop_ids
+        journey_cols = st.columns(2)
+        journey_origin = journey_cols[0].selectbox("From Stop", stops)
+        journey_destination = journey_cols[1].selectbox("To Stop", stops, index=min(1, len(stops) - 1))
+        journeys = optimizer.plan_journeys(journey_origin, journey_destination, max_transfers)
+        if not journeys and journey_origin != journey_destination:
+            st.info(f"No journey with at most {max_transfers} transfers")
+        for journey in journeys:
+            legs = ', '.join(f"{line} {start} → {end}" for line, start, end in journey['legs'])
+            st.write(f"- 🕒 {journey['travel_time']:.1f} minutes, 🔁 {journey['transfers']} transfers: {legs}")
+        
         # Show scheduling information
         st.subheader("Smart Scheduling")
         buses_needed = optimizer.calculate_buses_needed(capacity, 4, utilization)
@@ -218,6 +281,19 @@ def main():
             'Number of Buses': schedule
         })
         st.bar_chart(schedule_df.set_index('Time Period'))
+        
+        st.subheader("Fleet Allocation")
+        fleet_size = st.number_input("Fleet Size", min_value=1, value=int(bus_routes['buses_assigned'].sum()))
+        duty_hours = st.slider("Bus Duty Hours per Day", 8, 24, 16)
+        allocation = optimizer.allocate_fleet(fleet_size, duty_hours)
+        st.dataframe(allocation.pivot(index='routeid', columns='period', values='buses'))
+        
+        with st.expander("Fleet Scenario Sweep"):
+            sweep = optimizer.sweep_fleet_scenarios(range(30, 101, 5), range(50, 101, 10), [2, 4, 6])
+            sweep_trips = st.select_slider("Trips per Day", options=[2, 4, 6], value=4)
+            fleet = sweep[(sweep['trips_per_day'] == sweep_trips) & (sweep['period'] == 'morning_peak')]
+            st.line_chart(fleet.pivot(index='capacity', columns='utilization', values='buses_needed'))
+            st.dataframe(sweep)
 
 if __name__ == "__main__":
     main() 
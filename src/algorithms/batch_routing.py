@@ -0,0 +1,162 @@
+"""Offline batch emergency routing over a process pool
+
+Run from the src directory:
+    python -m algorithms.batch_routing incidents.csv routes.csv --workers 8
+
+The input CSV needs origin, hospital, time_period and emergency_mode columns.
+"""
+import argparse
+import csv
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from algorithms.compiled_graph import CompiledGraph
+from algorithms.graph_algorithms import TIME_PERIODS, compute_road_weights, a_star_search, heuristic_vector
+from utils.node_registry import NodeRegistry
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = ['query_id', 'origin', 'hospital', 'time_period', 'emergency_mode', 'travel_time', 'path']
+
+class SharedGraph:
+    """CompiledGraph arrays copied once into shared memory for the worker processes"""
+    FIELDS = ('offsets', 'targets', 'weights', 'lon', 'lat')
+
+    def __init__(self, graph):
+        self._blocks = []
+        self.spec = {}
+        for field in self.FIELDS:
+            if getattr(graph, field) is None:
+                continue
+            array = np.ascontiguousarray(getattr(graph, field))
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+            self._blocks.append(block)
+            self.spec[field] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    @staticmethod
+    def attach(spec):
+        """Worker side: CompiledGraph over the shared arrays (node ids are the indices), cached per process"""
+        key = spec['offsets'][0]
+        if key not in _attached:
+            blocks, arrays = [], {}
+            for field, (name, shape, dtype) in spec.items():
+                block = shared_memory.SharedMemory(name=name)
+                blocks.append(block)
+                arrays[field] = np.ndarray(shape, dtype, buffer=block.buf)
+            graph = CompiledGraph(range(len(arrays['offsets']) - 1),
+                                  arrays['offsets'], arrays['targets'], arrays['weights'])
+            graph.coordinates = (arrays.get('lon'), arrays.get('lat'))
+            _attached[key] = (graph, blocks)
+        return _attached[key][0]
+
+# worker-side graphs attached from shared memory, keyed by the offsets block name
+_attached = {}
+
+def _route_chunk(spec, chunk):
+    """Worker task: A* for a chunk of (query_id, source, target) index triples"""
+    graph = SharedGraph.attach(spec)
+    results = []
+    for query_id, source, target in chunk:
+        path, travel_time, _ = a_star_search(graph, source, target, heuristic_vector(graph, target, None))
+        results.append((query_id, path, travel_time))
+    return results
+
+def route_batch(queries, roads, traffic_flow, potential_roads, locations, workers=None, chunk_size=256):
+    """Route every (origin, hospital, time_period, emergency_mode) row, yielding result dicts as they complete
+
+    Queries are grouped by scenario, and each scenario graph is placed in shared memory
+    once. Workers receive only shared-memory names and integer node indices.
+    """
+    weights = compute_road_weights(roads, traffic_flow, potential_roads)
+    shared = {}
+    futures = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for (time_period, emergency_mode), group in queries.groupby(['time_period', 'emergency_mode'],
+                                                                        sort=False, dropna=False):
+                key = (time_period, bool(emergency_mode))
+
+                def result(query_id, travel_time=None, path=None, group=group, key=key):
+                    row = group.loc[query_id]
+                    return {
+                        'query_id': query_id,
+                        'origin': row['origin'],
+                        'hospital': row['hospital'],
+                        'time_period': key[0],
+                        'emergency_mode': key[1],
+                        'travel_time': travel_time,
+                        'path': path
+                    }
+
+                if str(time_period).strip().lower() not in TIME_PERIODS:
+                    logger.warning(f"Unknown time period {time_period!r}, {len(group)} queries left unrouted")
+                    for query_id in group.index:
+                        yield result(query_id)
+                    continue
+                graph = weights.graph(str(time_period).strip(), bool(emergency_mode))
+                graph.set_coordinates(locations)
+
+                sources = group['origin'].astype(str).str.strip().map(graph.node_index)
+                targets = group['hospital'].astype(str).str.strip().map(graph.node_index)
+                known = sources.notna() & targets.notna()
+                if not known.all():
+                    logger.warning(f"Scenario {key}: {int((~known).sum())} queries with unknown origin or hospital left unrouted")
+                for query_id in group.index[~known]:
+                    yield result(query_id)
+
+                triples = list(zip(group.index[known], sources[known].astype(int), targets[known].astype(int)))
+                if not triples:
+                    continue
+                shared[key] = SharedGraph(graph)
+                for i in range(0, len(triples), chunk_size):
+                    future = pool.submit(_route_chunk, shared[key].spec, triples[i:i + chunk_size])
+                    futures[future] = (graph, result)
+                logger.info(f"Scenario {key}: {len(triples)} queries in {-(-len(triples) // chunk_size)} chunks")
+
+            for future in as_completed(futures):
+                graph, result = futures.pop(future)
+                for query_id, path, travel_time in future.result():
+                    yield result(query_id, travel_time, graph.path_ids(path) if path is not None else None)
+    finally:
+        for block in shared.values():
+            block.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', help='CSV with origin, hospital, time_period, emergency_mode columns')
+    parser.add_argument('output', help='CSV file the routes are streamed to')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from utils.database import load_data
+    (neighborhoods, facilities, existing_roads, potential_roads,
+     _, _, _, traffic_flow) = load_data()
+    locations = NodeRegistry.from_tables(neighborhoods, facilities).locations()
+
+    queries = pd.read_csv(args.input, dtype={'origin': str, 'hospital': str})
+    queries['emergency_mode'] = queries['emergency_mode'].astype(str).str.strip().str.lower().isin(['1', 'true', 'yes'])
+
+    routed = 0
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        for row in route_batch(queries, existing_roads, traffic_flow, potential_roads, locations,
+                               args.workers, args.chunk_size):
+            row['path'] = ','.join(row['path']) if row['path'] else ''
+            writer.writerow(row)
+            routed += 1
+    logger.info(f"Wrote {routed} routes to {args.output}")
+
+if __name__ == '__main__':
+    main()
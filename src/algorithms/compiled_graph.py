@@ -0,0 +1,131 @@
+import hashlib
+import numpy as np
+
+
+class CompiledGraph:
+    """Directed weighted graph stored as CSR arrays over interned integer node indices"""
+    def __init__(self, node_ids, offsets, targets, weights):
+        self.node_ids = list(node_ids)
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.offsets = offsets  # int64, len(node_ids) + 1
+        self.targets = targets  # int32, one entry per edge
+        self.weights = weights  # float64, one entry per edge
+        self.coordinates = (None, None)  # (lon, lat) arrays, always replaced as one tuple
+        self.version = 0  # bumped by every in-place weight update
+        self._reverse = None
+
+    @classmethod
+    def from_edges(cls, node_ids, sources, targets, weights):
+        """Compile parallel source/target/weight index arrays, the last duplicate edge wins"""
+        n = len(node_ids)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+
+        # np.unique sorts the keys, which also orders the edges by (source, target)
+        keys = sources * n + targets
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = len(keys) - 1 - last
+        sources, targets, weights = sources[keep], targets[keep], weights[keep]
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+        return cls(node_ids, offsets, targets.astype(np.int32), weights)
+
+    @classmethod
+    def from_dict(cls, graph):
+        """Compile a dict-of-dicts adjacency mapping {u: {v: weight}}"""
+        node_index = {}
+        for u, neighbors in graph.items():
+            node_index.setdefault(u, len(node_index))
+            for v in neighbors:
+                node_index.setdefault(v, len(node_index))
+
+        sources, targets, weights = [], [], []
+        for u, neighbors in graph.items():
+            for v, weight in neighbors.items():
+                sources.append(node_index[u])
+                targets.append(node_index[v])
+                weights.append(weight)
+        return cls.from_edges(list(node_index), sources, targets, weights)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __contains__(self, node_id):
+        return node_id in self.node_index
+
+    @property
+    def lon(self):
+        return self.coordinates[0]
+
+    @property
+    def lat(self):
+        return self.coordinates[1]
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    def index(self, node_id):
+        """Interned integer index of an original node ID"""
+        return self.node_index[node_id]
+
+    def neighbors(self, u):
+        """Target indices and weights of the out-edges of node index u"""
+        lo, hi = self.offsets[u], self.offsets[u + 1]
+        return self.targets[lo:hi], self.weights[lo:hi]
+
+    def edge_position(self, u, v):
+        """Position of the edge u -> v in targets/weights, -1 if the edge does not exist"""
+        lo, hi = self.offsets[u], self.offsets[u + 1]
+        pos = lo + np.searchsorted(self.targets[lo:hi], v)
+        if pos == hi or self.targets[pos] != v:
+            return -1
+        return int(pos)
+
+    def edge_weight(self, from_id, to_id):
+        """Weight of the edge between two original node IDs"""
+        pos = self.edge_position(self.node_index[from_id], self.node_index[to_id])
+        if pos < 0:
+            raise KeyError((from_id, to_id))
+        return float(self.weights[pos])
+
+    def set_weights(self, positions, weights):
+        """Overwrite edge weights in place and bump the version, the reversed graph is rebuilt on next use"""
+        self.weights[np.asarray(positions, dtype=np.int64)] = weights
+        self._reverse = None
+        self.version += 1
+
+    def edge_sources(self):
+        """Source index of every edge, parallel to targets and weights"""
+        return np.repeat(np.arange(len(self.node_ids), dtype=np.int64), np.diff(self.offsets))
+
+    def reversed(self):
+        """Graph with every edge direction flipped, sharing node indices (built once)"""
+        if self._reverse is None:
+            self._reverse = CompiledGraph.from_edges(self.node_ids, self.targets, self.edge_sources(), self.weights)
+        self._reverse.coordinates = self.coordinates
+        return self._reverse
+
+    def fingerprint(self):
+        """Content hash of the node ids and CSR arrays, used as a disk cache key"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update('\x1f'.join(map(str, self.node_ids)).encode())
+        for array in (self.offsets, self.targets, self.weights):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def set_coordinates(self, locations):
+        """Attach lon/lat arrays from a {node_id: (lon, lat)} mapping, NaN where missing
+
+        Both arrays are published in one assignment, so a concurrent reader of a shared
+        graph sees either no coordinates or both.
+        """
+        coords = np.array([locations.get(node_id, (np.nan, np.nan)) for node_id in self.node_ids],
+                          dtype=np.float64).reshape(-1, 2)
+        self.coordinates = (coords[:, 0], coords[:, 1])
+
+    def path_ids(self, path):
+        """Map a sequence of node indices back to the original node IDs"""
+        return [self.node_ids[i] for i in path]
@@ -0,0 +1,226 @@
+import heapq
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def _csr(n, rows, targets, weights, middles):
+    """Pack edge lists into CSR arrays, rows sorted by target for binary search"""
+    rows = np.asarray(rows, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    order = np.lexsort((targets, rows))
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=offsets[1:])
+    return (
+        offsets,
+        targets[order].astype(np.int32),
+        np.asarray(weights, dtype=np.float64)[order],
+        np.asarray(middles, dtype=np.int64)[order]
+    )
+
+class ContractionHierarchy:
+    """Contraction hierarchy over a CompiledGraph for fast repeated point-to-point queries
+
+    up holds edges u -> v with rank[v] > rank[u] at row u, down holds edges u -> v with
+    rank[u] > rank[v] at row v. Each is (offsets, targets, weights, middles) where middles
+    is the contracted node a shortcut bypasses, or -1 for an original road.
+    """
+    def __init__(self, node_ids, rank, up, down):
+        self.node_ids = list(node_ids)
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.rank = np.asarray(rank, dtype=np.int64)
+        self.up = up
+        self.down = down
+        # per-node (target, weight) lists, the query loop is pure Python
+        self._up_rows = self._rows(up)
+        self._down_rows = self._rows(down)
+
+    @staticmethod
+    def _rows(edges):
+        offsets, targets, weights, _ = edges
+        offsets, targets, weights = offsets.tolist(), targets.tolist(), weights.tolist()
+        return [list(zip(targets[lo:hi], weights[lo:hi])) for lo, hi in zip(offsets[:-1], offsets[1:])]
+
+    @classmethod
+    def build(cls, graph, witness_limit=50, simulation_limit=10):
+        """Contract nodes in edge-difference order, adding shortcuts where no witness path exists"""
+        n = len(graph)
+        out_adj = [{} for _ in range(n)]
+        in_adj = [{} for _ in range(n)]
+        for u, v, w in zip(graph.edge_sources().tolist(), graph.targets.tolist(), graph.weights.tolist()):
+            if u != v:
+                out_adj[u][v] = (w, -1)
+                in_adj[v][u] = (w, -1)
+        deleted = [0] * n
+
+        def witness_search(source, excluded, max_cost, limit):
+            dist = {source: 0.0}
+            open_heap = [(0.0, source)]
+            settled = 0
+            while open_heap:
+                d, current = heapq.heappop(open_heap)
+                if d > dist[current]:
+                    continue
+                if d > max_cost or settled >= limit:
+                    break
+                settled += 1
+                for neighbor, (w, _) in out_adj[current].items():
+                    if neighbor == excluded:
+                        continue
+                    tentative = d + w
+                    if tentative < dist.get(neighbor, float('inf')):
+                        dist[neighbor] = tentative
+                        heapq.heappush(open_heap, (tentative, neighbor))
+            return dist
+
+        def shortcuts_for(v, limit):
+            shortcuts = []
+            outgoing = out_adj[v]
+            if not outgoing:
+                return shortcuts
+            max_out = max(w for w, _ in outgoing.values())
+            for u, (w_in, _) in in_adj[v].items():
+                dist = witness_search(u, v, w_in + max_out, limit)
+                for x, (w_out, _) in outgoing.items():
+                    if x != u and dist.get(x, float('inf')) > w_in + w_out:
+                        shortcuts.append((u, x, w_in + w_out))
+            return shortcuts
+
+        def priority(v):
+            # cheap simulated contraction, may overestimate the shortcuts needed
+            shortcuts = shortcuts_for(v, simulation_limit)
+            edge_difference = len(shortcuts) - len(in_adj[v]) - len(out_adj[v])
+            return 2 * edge_difference + deleted[v] + level[v]
+
+        level = [0] * n
+        open_heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(open_heap)
+        rank = [0] * n
+        up_edges, down_edges = [], []
+
+        order = 0
+        while open_heap:
+            _, v = heapq.heappop(open_heap)
+            # lazy update: re-queue if the node got more expensive than the next candidate
+            current_priority = priority(v)
+            if open_heap and current_priority > open_heap[0][0]:
+                heapq.heappush(open_heap, (current_priority, v))
+                continue
+            shortcuts = shortcuts_for(v, witness_limit)
+
+            neighbors = set(out_adj[v]) | set(in_adj[v])
+            for x, (w, middle) in out_adj[v].items():
+                up_edges.append((v, x, w, middle))
+                del in_adj[x][v]
+            for u, (w, middle) in in_adj[v].items():
+                down_edges.append((v, u, w, middle))
+                del out_adj[u][v]
+            out_adj[v] = {}
+            in_adj[v] = {}
+
+            for u, x, cost in shortcuts:
+                if cost < out_adj[u].get(x, (float('inf'),))[0]:
+                    out_adj[u][x] = (cost, v)
+                    in_adj[x][u] = (cost, v)
+
+            rank[v] = order
+            order += 1
+            for x in neighbors:
+                deleted[x] += 1
+                level[x] = max(level[x], level[v] + 1)
+
+        logger.info(f"Contraction hierarchy: {len(up_edges) + len(down_edges)} edges "
+                    f"({len(up_edges) + len(down_edges) - graph.num_edges} shortcuts)")
+        return cls(graph.node_ids, rank, _csr(n, *zip(*up_edges) if up_edges else ([], [], [], [])),
+                   _csr(n, *zip(*down_edges) if down_edges else ([], [], [], [])))
+
+    def query(self, start, end, stats=None):
+        """Bidirectional upward search, returns (path, travel_time) or (None, None)"""
+        start = str(start).strip()
+        end = str(end).strip()
+        if start not in self.node_index or end not in self.node_index:
+            logger.error(f"Route endpoints {start}, {end} not in hierarchy")
+            return None, None
+
+        source = self.node_index[start]
+        target = self.node_index[end]
+        forward_dist, backward_dist = {source: 0.0}, {target: 0.0}
+        forward_pred, backward_pred = {}, {}
+        forward_heap, backward_heap = [(0.0, source)], [(0.0, target)]
+        best = float('inf')
+        meeting = -1
+        settled_count = 0
+
+        # a direction can stop once its smallest key reaches the best meeting cost
+        while True:
+            forward_top = forward_heap[0][0] if forward_heap else float('inf')
+            backward_top = backward_heap[0][0] if backward_heap else float('inf')
+            if min(forward_top, backward_top) >= best:
+                break
+            if forward_top <= backward_top:
+                rows, stall_rows = self._up_rows, self._down_rows
+                dist, pred, open_heap, other_dist = forward_dist, forward_pred, forward_heap, backward_dist
+            else:
+                rows, stall_rows = self._down_rows, self._up_rows
+                dist, pred, open_heap, other_dist = backward_dist, backward_pred, backward_heap, forward_dist
+
+            d, current = heapq.heappop(open_heap)
+            if d > dist[current]:
+                continue
+            settled_count += 1
+            if current in other_dist and d + other_dist[current] < best:
+                best = d + other_dist[current]
+                meeting = current
+
+            # stall-on-demand: a higher node already reaches this one more cheaply
+            if any(dist.get(higher, float('inf')) + w < d for higher, w in stall_rows[current]):
+                continue
+
+            for neighbor, w in rows[current]:
+                tentative = d + w
+                if tentative < dist.get(neighbor, float('inf')):
+                    dist[neighbor] = tentative
+                    pred[neighbor] = current
+                    heapq.heappush(open_heap, (tentative, neighbor))
+
+        if stats is not None:
+            stats['settled'] = settled_count
+        if meeting < 0:
+            logger.warning(f"No path found from {start} to {end}")
+            return None, None
+
+        hierarchy_path = [meeting]
+        while hierarchy_path[-1] in forward_pred:
+            hierarchy_path.append(forward_pred[hierarchy_path[-1]])
+        hierarchy_path.reverse()
+        while hierarchy_path[-1] in backward_pred:
+            hierarchy_path.append(backward_pred[hierarchy_path[-1]])
+
+        path = [hierarchy_path[0]]
+        for u, v in zip(hierarchy_path[:-1], hierarchy_path[1:]):
+            path.extend(self.unpack(u, v))
+        return [self.node_ids[i] for i in path], best
+
+    def unpack(self, u, v):
+        """Original node indices after u along the hierarchy edge u -> v"""
+        nodes = []
+        stack = [(u, v)]
+        while stack:
+            a, b = stack.pop()
+            middle = self._middle(a, b)
+            if middle < 0:
+                nodes.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+        return nodes
+
+    def _middle(self, u, v):
+        if self.rank[u] < self.rank[v]:
+            offsets, targets, _, middles = self.up
+            row, column = u, v
+        else:
+            offsets, targets, _, middles = self.down
+            row, column = v, u
+        lo, hi = offsets[row], offsets[row + 1]
+        return int(middles[lo + np.searchsorted(targets[lo:hi], column)])
@@ -1,123 +1,375 @@
 import heapq
 import logging
+from bisect import bisect_right
 from collections import defaultdict
-from typing import List, Tuple, Dict, Set
 import networkx as nx
+import numpy as np
 import pandas as pd
 from geopy.distance import geodesic
-from utils.helpers import get_coordinates, haversine
+from utils.helpers import haversine_vector
+from utils.spatial_index import GridIndex, degrees_for_meters
+from utils.node_registry import NodeRegistry
+from algorithms.compiled_graph import CompiledGraph
 
 logger = logging.getLogger(__name__)
 
+TIME_PERIODS = ['morning_peak', 'afternoon', 'evening_peak', 'night']
+TIME_PERIOD_FACTORS = {
+    'morning_peak': {'base_speed': 40, 'congestion_factor': 1.3},
+    'afternoon': {'base_speed': 45, 'congestion_factor': 1.0},
+    'evening_peak': {'base_speed': 35, 'congestion_factor': 1.4},
+    'night': {'base_speed': 55, 'congestion_factor': 0.8}
+}
+BPR_ALPHA = 0.15
+BPR_BETA = 4
+
+class RoadWeights:
+    """BPR travel times of every directed road for all time periods and both routing modes"""
+    def __init__(self, node_ids, sources, targets, is_potential, distance, capacity, condition, volumes):
+        self.node_ids = node_ids
+        self.node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+        self.sources = sources
+        self.targets = targets
+        self.is_potential = is_potential
+        self.distance = distance
+        self.capacity = capacity
+        self.condition = condition
+        self.volumes = np.array(volumes, dtype=np.float64)  # own copy, shape (edges, len(TIME_PERIODS))
+        self.weights = np.empty((len(sources), len(TIME_PERIODS), 2), dtype=np.float64)  # last axis is emergency_mode
+        self.version = 0
+        self._edge_rows = None
+        self._recompute(slice(None))
+
+    def _recompute(self, rows):
+        """BPR travel times of the selected edge rows for every period and mode"""
+        base_speed = np.array([TIME_PERIOD_FACTORS[p]['base_speed'] for p in TIME_PERIODS], dtype=np.float64)
+        alpha = BPR_ALPHA * np.array([TIME_PERIOD_FACTORS[p]['congestion_factor'] for p in TIME_PERIODS])
+        distance = self.distance[rows, None]
+        condition = self.condition[rows, None]
+        capacity = self.capacity[rows, None]
+        volumes = self.volumes[rows]
+
+        for mode, emergency_mode in enumerate([False, True]):
+            mode_volumes = volumes * 0.2 if emergency_mode else volumes  # 80% traffic reduction
+            mode_capacity = np.trunc(capacity * 1.5) if emergency_mode else capacity
+            mode_speed = base_speed * 1.2 if emergency_mode else base_speed
+
+            free_flow_time = distance / (mode_speed * (condition / 10))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                traffic_ratio = np.where(mode_capacity != 0, mode_volumes / mode_capacity, 1.0)
+            traffic_ratio = np.minimum(traffic_ratio, 2.0)  # maximum at 200% capacity
+            self.weights[rows, :, mode] = free_flow_time * (1 + alpha * traffic_ratio ** BPR_BETA)
+
+    def edge_rows(self, u, v):
+        """Rows of the directed edge u -> v (node indices), existing roads before potential ones"""
+        if self._edge_rows is None:
+            self._edge_rows = defaultdict(list)
+            for row, key in enumerate(zip(self.sources.tolist(), self.targets.tolist())):
+                self._edge_rows[key].append(row)
+        return self._edge_rows.get((u, v), [])
+
+    def update_traffic(self, changes):
+        """Apply (fromid, toid, time_period, volume) counts, recomputing only the affected edges
+
+        Returns {time_period: set of (u, v) node index pairs} for patching compiled graphs.
+        """
+        # validate the whole batch first, so a bad row cannot leave volumes and weights out of step
+        updates = []
+        for from_id, to_id, time_period, volume in changes:
+            u = self.node_index.get(str(from_id).strip())
+            v = self.node_index.get(str(to_id).strip())
+            rows = self.edge_rows(u, v)
+            if not rows:
+                logger.warning(f"Traffic update for unknown road {from_id} -> {to_id} ignored")
+                continue
+            period = str(time_period).strip().lower()
+            if period not in TIME_PERIODS:
+                logger.warning(f"Traffic update for unknown time period {time_period} on {from_id} -> {to_id} ignored")
+                continue
+            try:
+                volume = float(volume)
+            except (TypeError, ValueError):
+                logger.warning(f"Traffic update with invalid volume {volume!r} on {from_id} -> {to_id} ignored")
+                continue
+            updates.append((u, v, rows, period, volume))
+
+        affected = defaultdict(set)
+        changed_rows = set()
+        for u, v, rows, period, volume in updates:
+            self.volumes[rows, TIME_PERIODS.index(period)] = volume
+            changed_rows.update(rows)
+            affected[period].add((u, v))
+
+        if changed_rows:
+            self._recompute(np.fromiter(changed_rows, dtype=np.int64))
+            self.version += 1
+            logger.info(f"Traffic update: {len(changed_rows)} edges recomputed, version {self.version}")
+        return dict(affected)
+
+    def patch_graph(self, graph, time_period, emergency_mode, edges):
+        """Write the current weights of (u, v) edges into a graph compiled by graph() in place"""
+        period = TIME_PERIODS.index(time_period.lower())
+        positions, values = [], []
+        for u, v in edges:
+            # same rule as graph(): potential roads only in emergency mode, last duplicate wins
+            rows = [r for r in self.edge_rows(u, v) if emergency_mode or not self.is_potential[r]]
+            pos = graph.edge_position(u, v)
+            if rows and pos >= 0:
+                positions.append(pos)
+                values.append(self.weights[rows[-1], period, int(emergency_mode)])
+        if positions:
+            graph.set_weights(positions, values)
+
+    def graph(self, time_period, emergency_mode=False):
+        """Compiled graph for one time period, a column selection of the weight block"""
+        period = TIME_PERIODS.index(time_period.lower())
+        mask = slice(None) if emergency_mode else ~self.is_potential
+        return CompiledGraph.from_edges(
+            self.node_ids,
+            self.sources[mask],
+            self.targets[mask],
+            self.weights[mask, period, int(emergency_mode)]
+        )
+
+def _directed_roads(roads):
+    """Expand road rows into both travel directions, interleaved as (from, to), (to, from)"""
+    from_ids = roads['fromid'].astype(str).str.strip().to_numpy()
+    to_ids = roads['toid'].astype(str).str.strip().to_numpy()
+    n = len(roads)
+
+    def column(name, default):
+        if name in roads.columns:
+            return roads[name].to_numpy(dtype=np.float64)
+        return np.full(n, default, dtype=np.float64)
+
+    return pd.DataFrame({
+        'src': np.column_stack([from_ids, to_ids]).ravel(),
+        'dst': np.column_stack([to_ids, from_ids]).ravel(),
+        'distance': np.repeat(column('distance_km', 0.0), 2),
+        'capacity': np.repeat(np.trunc(column('current_capacity', 2000)), 2),
+        'condition': np.repeat(np.trunc(column('coondition', 7)), 2)
+    })
+
+def compute_road_weights(roads, traffic_flow, potential_roads=None):
+    """Vectorized BPR weight engine over existing and potential roads"""
+    frames = [_directed_roads(roads)]
+    if potential_roads is not None and not potential_roads.empty:
+        frames.append(_directed_roads(potential_roads))
+    edges = pd.concat(frames, ignore_index=True)
+    is_potential = np.zeros(len(edges), dtype=bool)
+    is_potential[len(frames[0]):] = True
+
+    traffic = traffic_flow.assign(
+        src=traffic_flow['fromid'].astype(str).str.strip(),
+        dst=traffic_flow['toid'].astype(str).str.strip()
+    ).drop_duplicates(['src', 'dst'], keep='last')
+    volumes = edges[['src', 'dst']].merge(
+        traffic[['src', 'dst'] + TIME_PERIODS], on=['src', 'dst'], how='left'
+    )[TIME_PERIODS].fillna(0).to_numpy(dtype=np.float64)
+
+    # node ids interned in order of first appearance
+    codes, node_ids = pd.factorize(edges['src'])
+    targets = pd.Index(node_ids).get_indexer(edges['dst'])
+
+    return RoadWeights(list(node_ids), codes.astype(np.int64), targets.astype(np.int64), is_potential,
+                       edges['distance'].to_numpy(), edges['capacity'].to_numpy(),
+                       edges['condition'].to_numpy(), volumes)
+
 def build_graph(roads, traffic_flow, time_period, potential_roads, emergency_mode=False):
-    """Build a graph for routing"""
-    graph = defaultdict(dict)
+    """Build a compiled graph for routing"""
     try:
-        traffic_dict = {(str(row['fromid']).strip(), str(row['toid']).strip()): row[time_period.lower()]
-                       for _, row in traffic_flow.iterrows()}
-        
-        # add existing roads
-        for _, road in roads.iterrows():
-            add_road_to_graph(graph, road, traffic_dict, time_period, emergency_mode)
-        
-        if emergency_mode:
-            for _, road in potential_roads.iterrows():
-                add_road_to_graph(graph, road, traffic_dict, time_period, emergency_mode)
-                
-        logger.info(f"Graph nodes: {list(graph.keys())}")
+        graph = compute_road_weights(roads, traffic_flow, potential_roads).graph(time_period, emergency_mode)
+        logger.info(f"Graph built: {len(graph)} nodes, {graph.num_edges} edges")
         return graph
         
     except Exception as e:
         logger.exception("Graph build error")
-        return graph
+        return CompiledGraph.from_edges([], [], [], [])
 
-def add_road_to_graph(graph, road, traffic_dict, time_period, emergency_mode):
-    """Add a road to the graph with appropriate weights"""
-    from_id = str(road['fromid']).strip()
-    to_id = str(road['toid']).strip()
-    
-    for src, dst in [(from_id, to_id), (to_id, from_id)]:
-        distance = float(road['distance_km'])
-        capacity = int(road.get('current_capacity', 2000))
-        condition = int(road.get('coondition', 7))
-        
-        traffic = traffic_dict.get((src, dst), 0)
-        
-        time_period_factors = {
-            'morning_peak': {'base_speed': 40, 'congestion_factor': 1.3},
-            'afternoon': {'base_speed': 45, 'congestion_factor': 1.0},
-            'evening_peak': {'base_speed': 35, 'congestion_factor': 1.4},
-            'night': {'base_speed': 55, 'congestion_factor': 0.8}
-        }
-        
-        period = time_period.lower()
-        base_speed = time_period_factors[period]['base_speed']
-        congestion_factor = time_period_factors[period]['congestion_factor']
-        
-        if emergency_mode:
-            traffic = traffic * 0.2  # 80% traffic reduction 
-            capacity = int(capacity * 1.5)  
-            base_speed *= 1.2  
-        
-        free_flow_speed = base_speed * (condition / 10)  
-        
-        free_flow_time = distance / free_flow_speed
-        
-        alpha = 0.15 * congestion_factor
-        beta = 4
-        
-        traffic_ratio = min(traffic / capacity if capacity != 0 else 1.0, 2.0)  # maximum at 200% capacity
-        
-        travel_time = free_flow_time * (1 + alpha * (traffic_ratio ** beta))
-        
-        graph[src][dst] = travel_time
+AVERAGE_SPEED_KMH = 50
+
+def a_star(graph, start, end, locations, landmarks=None, stats=None, bidirectional=False):
+    """A* pathfinding algorithm, returns (path, travel_time) or (None, None)
 
-def a_star(graph, start, end, locations):
-    """A* pathfinding algorithm"""
+    With a LandmarkTable the ALT lower bounds replace the haversine heuristic.
+    bidirectional=True searches from both ends; it uses the landmark bounds as
+    average potentials when given, and is plain bidirectional Dijkstra otherwise,
+    since the haversine bound is not guaranteed consistent.
+    If a stats dict is given, the number of settled nodes is stored in it.
+    """
     start = str(start).strip()
     end = str(end).strip()
     
     if start not in graph:
-        logger.error(f"Start node {start} not in graph. Available nodes: {list(graph.keys())}")
-        return None
+        logger.error(f"Start node {start} not in graph")
+        return None, None
     if end not in graph:
-        logger.error(f"End node {end} not in graph. Available nodes: {list(graph.keys())}")
-        return None
+        logger.error(f"End node {end} not in graph")
+        return None, None
 
-    open_heap = []
-    heapq.heappush(open_heap, (0, start))
+    source = graph.index(start)
+    target = graph.index(end)
+    if bidirectional:
+        potential = None
+        if landmarks is not None:
+            potential = (landmarks.heuristic(target) - landmarks.heuristic_from(source)) / 2
+        path, travel_time, settled_count = bidirectional_search(graph, source, target, potential)
+    else:
+        if landmarks is not None:
+            h_scores = landmarks.heuristic(target)
+        else:
+            h_scores = heuristic_vector(graph, target, locations)
+        path, travel_time, settled_count = a_star_search(graph, source, target, h_scores)
+    if stats is not None:
+        stats['settled'] = settled_count
+    if path is None:
+        logger.warning(f"No path found from {start} to {end}")
+        return None, None
+
+    path = graph.path_ids(path)
+    logger.info(f"Path found: {path} ({settled_count} nodes settled)")
+    return path, travel_time
+
+def a_star_search(graph, source, target, h_scores):
+    """A* over node indices, returns (index path, travel_time, settled count), path None if unreachable"""
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    h_scores = h_scores.tolist()
+
+    open_heap = [(h_scores[source], source)]
     came_from = {}
-    g_scores = {start: 0}
-    f_scores = {start: heuristic(start, end, locations)}
+    g_scores = [float('inf')] * len(graph)
+    g_scores[source] = 0
+    settled = [False] * len(graph)
+    settled_count = 0
 
     while open_heap:
-        current_f, current = heapq.heappop(open_heap)
+        _, current = heapq.heappop(open_heap)
+        if settled[current]:
+            continue
+        settled[current] = True
+        settled_count += 1
 
-        if current == end:
-            path = reconstruct_path(came_from, current)
-            logger.info(f"Path found: {path}")
-            return path
+        if current == target:
+            return reconstruct_path(came_from, current), g_scores[current], settled_count
 
-        for neighbor, time in graph[current].items():
-            tentative_g = g_scores.get(current, float('inf')) + time
-            if tentative_g < g_scores.get(neighbor, float('inf')):
+        g_current = g_scores[current]
+        lo, hi = offsets[current], offsets[current + 1]
+        for neighbor, time in zip(targets[lo:hi].tolist(), weights[lo:hi].tolist()):
+            if settled[neighbor]:
+                continue
+            tentative_g = g_current + time
+            if tentative_g < g_scores[neighbor]:
                 came_from[neighbor] = current
                 g_scores[neighbor] = tentative_g
-                f_scores[neighbor] = tentative_g + heuristic(neighbor, end, locations)
-                heapq.heappush(open_heap, (f_scores[neighbor], neighbor))
+                heapq.heappush(open_heap, (tentative_g + h_scores[neighbor], neighbor))
 
-    logger.warning(f"No path found from {start} to {end}")
-    return None
+    return None, None, settled_count
 
-def heuristic(node, end, locations):
-    """Heuristic function for A* algorithm"""
-    try:
-        lon1, lat1 = locations[node]
-        lon2, lat2 = locations[end]
-        return haversine(lon1, lat1, lon2, lat2) / 50  # 50 km/h average
-    except KeyError as e:
-        logger.error(f"Missing coordinates for node {e}")
-        return float('inf')
+def bidirectional_search(graph, source, target, potential=None):
+    """Bidirectional A* over node indices, returns (index path, travel_time, settled count)
+
+    The backward search runs on the reversed graph, so asymmetric weights are handled.
+    potential is the forward potential (h_target - h_source) / 2, the backward search
+    uses its negation; both searches then work on the same reduced costs and may stop
+    once the two smallest keys sum to at least the best meeting cost. None gives
+    bidirectional Dijkstra.
+    """
+    if source == target:
+        return [source], 0.0, 1
+    n = len(graph)
+    if potential is None:
+        potential = [0.0] * n
+    else:
+        potential = np.nan_to_num(potential, nan=0.0).tolist()
+
+    graphs = (graph, graph.reversed())
+    signs = (1.0, -1.0)
+    dist = ([float('inf')] * n, [float('inf')] * n)
+    pred = ([-1] * n, [-1] * n)
+    settled = ([False] * n, [False] * n)
+    dist[0][source] = 0.0
+    dist[1][target] = 0.0
+    heaps = ([(potential[source], source)], [(-potential[target], target)])
+    best = float('inf')
+    meeting = -1
+    settled_count = 0
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        _, current = heapq.heappop(heaps[side])
+        if settled[side][current]:
+            continue
+        settled[side][current] = True
+        settled_count += 1
+
+        search_graph, sign = graphs[side], signs[side]
+        own_dist, own_pred, other_dist = dist[side], pred[side], dist[1 - side]
+        g_current = own_dist[current]
+        lo, hi = search_graph.offsets[current], search_graph.offsets[current + 1]
+        for neighbor, time in zip(search_graph.targets[lo:hi].tolist(), search_graph.weights[lo:hi].tolist()):
+            tentative = g_current + time
+            if tentative < own_dist[neighbor]:
+                own_dist[neighbor] = tentative
+                own_pred[neighbor] = current
+                heapq.heappush(heaps[side], (tentative + sign * potential[neighbor], neighbor))
+            if tentative + other_dist[neighbor] < best:
+                best = tentative + other_dist[neighbor]
+                meeting = neighbor
+
+    if meeting < 0:
+        return None, None, settled_count
+
+    path = [meeting]
+    while pred[0][path[-1]] >= 0:
+        path.append(pred[0][path[-1]])
+    path.reverse()
+    while pred[1][path[-1]] >= 0:
+        path.append(pred[1][path[-1]])
+    return path, best, settled_count
+
+def heuristic_vector(graph, target, locations):
+    """A* heuristic of every node against the target index, one vectorized haversine call"""
+    lon, lat = graph.coordinates  # one read, another session may be attaching them
+    if lon is None:
+        graph.set_coordinates(locations)
+        lon, lat = graph.coordinates
+    h = haversine_vector(lon, lat, lon[target], lat[target]) / AVERAGE_SPEED_KMH
+    missing = np.isnan(h)
+    if missing.any():
+        logger.error(f"Missing coordinates for {int(missing.sum())} nodes")
+        h[missing] = np.inf
+    return h
+
+def dijkstra(graph, sources):
+    """Multi-source Dijkstra over a CompiledGraph, returns (dist, pred) index arrays"""
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    dist = [float('inf')] * len(graph)
+    pred = [-1] * len(graph)
+    settled = [False] * len(graph)
+
+    open_heap = []
+    for source in sources:
+        dist[source] = 0.0
+        open_heap.append((0.0, source))
+    heapq.heapify(open_heap)
+
+    while open_heap:
+        d, current = heapq.heappop(open_heap)
+        if settled[current]:
+            continue
+        settled[current] = True
+
+        lo, hi = offsets[current], offsets[current + 1]
+        for neighbor, time in zip(targets[lo:hi].tolist(), weights[lo:hi].tolist()):
+            tentative = d + time
+            if tentative < dist[neighbor]:
+                dist[neighbor] = tentative
+                pred[neighbor] = current
+                heapq.heappush(open_heap, (tentative, neighbor))
+
+    return np.array(dist, dtype=np.float64), np.array(pred, dtype=np.int64)
 
 def reconstruct_path(came_from, current):
     """Reconstruct the path from came_from dictionary"""
@@ -128,106 +380,211 @@ def reconstruct_path(came_from, current):
     return path[::-1]
 
 class UnionFind:
-    """Union-Find data structure for Kruskal's algorithm"""
-    def __init__(self):
-        self.parent = {}
-        self.rank = {}
-    
-    def make_set(self, vertex):
-        if vertex not in self.parent:
-            self.parent[vertex] = vertex
-            self.rank[vertex] = 0
+    """Union-Find over integer indices 0..n-1 for Kruskal's algorithm"""
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.rank = [0] * n
     
     def find(self, vertex):
-        if self.parent[vertex] != vertex:
-            self.parent[vertex] = self.find(self.parent[vertex])
-        return self.parent[vertex]
+        parent = self.parent
+        while parent[vertex] != vertex:
+            parent[vertex] = parent[parent[vertex]]  # path halving
+            vertex = parent[vertex]
+        return vertex
     
     def union(self, vertex1, vertex2):
+        """Merge the sets of two vertices, False if they were already connected"""
         root1 = self.find(vertex1)
         root2 = self.find(vertex2)
+        if root1 == root2:
+            return False
+        if self.rank[root1] < self.rank[root2]:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        if self.rank[root1] == self.rank[root2]:
+            self.rank[root1] += 1
+        return True
+
+def kruskal_mst(sources, targets, weights, n):
+    """Kruskal's MST over edge index arrays, returns the indices of the MST edges"""
+    order = np.argsort(np.asarray(weights, dtype=np.float64), kind='stable')
+    sources = np.asarray(sources)[order].tolist()
+    targets = np.asarray(targets)[order].tolist()
+    
+    uf = UnionFind(n)
+    mst_edges = []
+    for i, u, v in zip(order.tolist(), sources, targets):
+        if uf.union(u, v):
+            mst_edges.append(i)
+            if len(mst_edges) == n - 1:
+                break
+    
+    return np.array(mst_edges, dtype=np.int64)
+
+class CycleCover:
+    """Tree edges that lie on a cycle once extra edges are added to a spanning forest
+
+    Nodes are merged upward into their parent as their parent edge gets covered, so
+    each tree edge is walked at most once over all calls to cover.
+    """
+    def __init__(self, sources, targets, n):
+        self.adjacency = [[] for _ in range(n)]
+        for u, v in zip(sources.tolist(), targets.tolist()):
+            self.adjacency[u].append(v)
+            self.adjacency[v].append(u)
+        self.parent = [-1] * n
+        self.depth = [0] * n
+        self.tin = [0] * n  # subtree of v holds the nodes with tin[v] <= tin < tout[v]
+        self.tout = [0] * n
+        self.top = list(range(n))
         
-        if root1 != root2:
-            if self.rank[root1] < self.rank[root2]:
-                root1, root2 = root2, root1
-            self.parent[root2] = root1
-            if self.rank[root1] == self.rank[root2]:
-                self.rank[root1] += 1
-
-def kruskal_mst(edges: List[Tuple], vertices: Set) -> List[Tuple]:
-    """Implementation of Kruskal's MST algorithm"""
-    sorted_edges = sorted(edges, key=lambda x: x[2])
+        visited = [False] * n
+        clock = 0
+        for root in range(n):
+            if visited[root]:
+                continue
+            visited[root] = True
+            self.tin[root] = clock
+            clock += 1
+            stack = [(root, iter(self.adjacency[root]))]
+            while stack:
+                node, neighbors = stack[-1]
+                for neighbor in neighbors:
+                    if not visited[neighbor]:
+                        visited[neighbor] = True
+                        self.parent[neighbor] = node
+                        self.depth[neighbor] = self.depth[node] + 1
+                        self.tin[neighbor] = clock
+                        clock += 1
+                        stack.append((neighbor, iter(self.adjacency[neighbor])))
+                        break
+                else:
+                    self.tout[node] = clock
+                    stack.pop()
     
-    uf = UnionFind()
-    for vertex in vertices:
-        uf.make_set(vertex)
+    def find(self, x):
+        while self.top[x] != x:
+            self.top[x] = self.top[self.top[x]]
+            x = self.top[x]
+        return x
     
-    mst_edges = []
-    for u, v, weight, data in sorted_edges:
-        if uf.find(u) != uf.find(v):
-            uf.union(u, v)
-            mst_edges.append((u, v, data))
+    def covered(self, x):
+        """Whether the tree edge from x to its parent lies on a cycle"""
+        return self.top[x] != x
+    
+    def incident(self, x):
+        """Tree edges at x, named by their lower node"""
+        edges = [c for c in self.adjacency[x] if c != self.parent[x]]
+        if self.parent[x] >= 0:
+            edges.append(x)
+        return edges
+    
+    def through(self, x, y, children):
+        """Tree edge at x on the tree path to y, children being x's children sorted by tin"""
+        if not self.tin[x] <= self.tin[y] < self.tout[x]:
+            return x
+        return children[bisect_right([self.tin[c] for c in children], self.tin[y]) - 1]
     
-    return mst_edges
+    def cover(self, x, y):
+        """Add edge (x, y), putting every tree edge on the path between them on a cycle"""
+        x, y = self.find(x), self.find(y)
+        while x != y:
+            if self.depth[x] < self.depth[y]:
+                x, y = y, x
+            self.top[x] = self.parent[x]
+            x = self.find(x)
 
-def compute_mst(graph):
-    """Compute MST with facility connectivity validation"""
-    #standard MST
-    edges = [(u, v, d['weight'], d) for u, v, d in graph.edges(data=True)]
-    vertices = set(graph.nodes())
+def compute_mst(graph, min_connections=2):
+    """Compute MST, then give every facility min_connections roads, none of them a bridge when min_connections >= 2"""
+    #standard MST over integer node indices
+    nodes = list(graph.nodes())
+    node_index = {node: i for i, node in enumerate(nodes)}
+    edges = list(graph.edges(data=True))
+    sources = np.fromiter((node_index[u] for u, _, _ in edges), dtype=np.int64, count=len(edges))
+    targets = np.fromiter((node_index[v] for _, v, _ in edges), dtype=np.int64, count=len(edges))
+    weights = np.fromiter((d['weight'] for _, _, d in edges), dtype=np.float64, count=len(edges))
     
-    mst_edges = kruskal_mst(edges, vertices)
+    mst_edges = kruskal_mst(sources, targets, weights, len(nodes))
     
     mst = nx.Graph()
-    for u, v, data in mst_edges:
-        mst.add_edge(u, v, **data)
+    mst.add_edges_from(edges[i] for i in mst_edges.tolist())
     
-    facilities = pd.DataFrame([node for node in graph.nodes() if not str(node).isdigit()], columns=['ID'])
+    is_facility = np.array([not str(node).isdigit() for node in nodes], dtype=bool)
+    facilities = pd.DataFrame([node for node in nodes if not str(node).isdigit()], columns=['ID'])
     
-    if not validate_facility_connectivity(mst, facilities):
-        uf = UnionFind()
-        for vertex in vertices:
-            uf.make_set(vertex)
+    if not validate_facility_connectivity(mst, facilities, min_connections):
+        in_mst = np.zeros(len(edges), dtype=bool)
+        in_mst[mst_edges] = True
+        degree = (np.bincount(sources[mst_edges], minlength=len(nodes)) +
+                  np.bincount(targets[mst_edges], minlength=len(nodes))).tolist()
+        tree = CycleCover(sources[mst_edges], targets[mst_edges], len(nodes))
         
-        for u, v in mst.edges():
-            uf.union(u, v)
+        # non-MST roads of every facility, grouped by facility and sorted by weight, built once
+        ends = np.concatenate([sources, targets])
+        candidates = np.concatenate([np.arange(len(edges))] * 2)
+        keep = is_facility[ends] & ~in_mst[candidates] & (sources != targets)[candidates]
+        ends, candidates = ends[keep], candidates[keep]
+        order = np.lexsort((weights[candidates], ends))
+        ends, candidates = ends[order], candidates[order]
+        bounds = np.searchsorted(ends, np.arange(len(nodes) + 1)).tolist()
         
-        for facility in facilities['ID']:
-            if mst.degree(facility) < 2:
-                potential_edges = []
-                for u, v, d in graph.edges(facility, data=True):
-                    if v not in mst.neighbors(facility):
-                        potential_edges.append((u, v, d['weight'], d))
-                
-                if potential_edges:
-                    potential_edges.sort(key=lambda x: x[2])
-                    
-                    for u, v, _, data in potential_edges:
-                        if uf.find(u) != uf.find(v):  
-                            mst.add_edge(u, v, **data)
-                            uf.union(u, v)
-                            break
+        short = 0
+        for facility in np.flatnonzero(is_facility).tolist():
+            children = sorted((c for c in tree.adjacency[facility] if c != tree.parent[facility]),
+                              key=tree.tin.__getitem__)
+            bridges = [x for x in tree.incident(facility) if not tree.covered(x)] if min_connections >= 2 else []
+            for i in candidates[bounds[facility]:bounds[facility + 1]].tolist():
+                if degree[facility] >= min_connections and not bridges:
+                    break
+                if in_mst[i]:
+                    continue  # already added for the facility at its other end
+                other = int(targets[i] if sources[i] == facility else sources[i])
+                # past the degree target, only roads that close a cycle through a bridge help
+                if degree[facility] >= min_connections and tree.covered(tree.through(facility, other, children)):
+                    continue
+                in_mst[i] = True
+                degree[facility] += 1
+                degree[other] += 1
+                tree.cover(facility, other)
+                bridges = [x for x in bridges if not tree.covered(x)]
+                u, v, data = edges[i]
+                mst.add_edge(u, v, **data)
+            if degree[facility] < min_connections or bridges:
+                short += 1
+        
+        if short:
+            logger.warning(f"{short} facilities lack {min_connections} redundant roads in the full network")
     
     return mst
 
 def validate_facility_connectivity(mst: nx.Graph, facilities: pd.DataFrame, min_connections: int = 2) -> bool:
-    """Validate that each facility has adequate connectivity in the MST"""
+    """Validate that each facility has min_connections roads in the MST and, from 2 up, no bridge among them"""
+    facility_ids = set(facilities['ID'])
     facility_connections = defaultdict(int)
     
     for u, v in mst.edges():
-        if u in facilities['ID'].values:
+        if u in facility_ids:
             facility_connections[u] += 1
-        if v in facilities['ID'].values:
+        if v in facility_ids:
             facility_connections[v] += 1
     
     # check if all facilities meet minimum connectivity
-    for facility_id in facilities['ID']:
+    for facility_id in facility_ids:
         if facility_connections[facility_id] < min_connections:
             return False
+    
+    # a bridge at a facility cuts it off when that one road fails
+    if min_connections >= 2:
+        for u, v in nx.bridges(mst):
+            if u in facility_ids or v in facility_ids:
+                return False
     return True
 
-def identify_transfer_points(bus_routes, metro_lines, neighborhoods, facilities, max_distance=500):
+def identify_transfer_points(bus_routes, metro_lines, neighborhoods, facilities, max_distance=500, registry=None):
     """Detect transfer points between networks"""
+    if registry is None:
+        registry = NodeRegistry.from_tables(neighborhoods, facilities)
+    
     metro_stations = set()
     for _, line in metro_lines.iterrows():
         stations = line['stations']
@@ -235,22 +592,30 @@ def identify_transfer_points(bus_routes, metro_lines, neighborhoods, facilities,
             stations = stations.split(',')
         metro_stations.update(stations)
     
-    bus_stops = set()
-    bus_coords = {}
+    bus_stops = []
     for _, route in bus_routes.iterrows():
         stops = route['stops']
         if isinstance(stops, str):
             stops = stops.split(',')
-        for stop in stops:
-            bus_stops.add(stop)
-            bus_coords[stop] = get_coordinates(stop, neighborhoods, facilities)
+        bus_stops.extend(stops)
+    bus_stops = list(dict.fromkeys(bus_stops))
+    bus_coords = dict(zip(bus_stops, map(tuple, registry.coordinates_many(bus_stops).tolist())))
     
     transfer_points = []
     connections = defaultdict(list)
+    if not bus_coords:
+        return pd.DataFrame(transfer_points), connections
+    
+    metro_coords = {metro: registry.coordinates(metro) for metro in metro_stations}
+    bus_items = list(bus_coords.items())
+    # geodesic reads the first coordinate as latitude; the grid only narrows the
+    # candidates, the exact geodesic check below decides
+    max_latitude = max(abs(c[0]) for c in list(bus_coords.values()) + list(metro_coords.values()))
+    index = GridIndex([coord for _, coord in bus_items], degrees_for_meters(max_distance, max_latitude))
     
-    for metro in metro_stations:
-        metro_coord = get_coordinates(metro, neighborhoods, facilities)
-        for bus_stop, bus_coord in bus_coords.items():
+    for metro, metro_coord in metro_coords.items():
+        for i in index.candidates(metro_coord):
+            bus_stop, bus_coord = bus_items[i]
             if geodesic(metro_coord, bus_coord).meters <= max_distance:
                 transfer_points.append({
                     'id': f"{metro}-{bus_stop}",
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import threading
+import pandas as pd
+from algorithms.compiled_graph import CompiledGraph
+from algorithms.graph_algorithms import compute_road_weights
+from algorithms.landmarks import load_landmarks
+from algorithms.contraction_hierarchies import ContractionHierarchy
+from algorithms.nearest_facility import NearestFacilityTable
+
+logger = logging.getLogger(__name__)
+
+def table_fingerprint(*tables):
+    """Content hash of a sequence of DataFrames"""
+    digest = hashlib.blake2b(digest_size=16)
+    for table in tables:
+        if table is None:
+            digest.update(b'none')
+            continue
+        digest.update(','.join(map(str, table.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(table, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+class GraphCache:
+    """Process-wide cache of compiled scenario graphs keyed by (time_period, emergency_mode)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._weights = None
+        self._graphs = {}
+        self._landmarks = {}
+        self._hierarchies = {}
+        self._nearest = {}
+        self._build_locks = {}  # (table name, key) -> lock held while that value is built
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, roads, traffic_flow, time_period, potential_roads, emergency_mode=False):
+        """Return the scenario graph, rebuilding only when the underlying tables changed"""
+        fingerprint = table_fingerprint(roads, traffic_flow, potential_roads)
+        key = (time_period.lower(), bool(emergency_mode))
+
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                if self._fingerprint is not None:
+                    logger.info("Road tables changed, invalidating graph cache")
+                self._clear()
+                self._fingerprint = fingerprint
+
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self.hits += 1
+                return graph
+
+            self.misses += 1
+            try:
+                if self._weights is None:
+                    self._weights = compute_road_weights(roads, traffic_flow, potential_roads)
+                graph = self._weights.graph(time_period, emergency_mode)
+            except Exception:
+                logger.exception("Graph build error")
+                return CompiledGraph.from_edges([], [], [], [])
+
+            self._graphs[key] = graph
+            logger.info(f"Cached graph {key}: {len(graph)} nodes, {graph.num_edges} edges")
+            return graph
+
+    def get_landmarks(self, time_period, emergency_mode=False, seeds=(), k=8):
+        """ALT landmark table of an already cached scenario graph, None if it is not cached"""
+        key = (time_period.lower(), bool(emergency_mode))
+        return self._derived('_landmarks', key, lambda graph: load_landmarks(graph, k, seeds))
+
+    def get_hierarchy(self, time_period, emergency_mode=False):
+        """Contraction hierarchy of an already cached scenario graph, None if it is not cached"""
+        key = (time_period.lower(), bool(emergency_mode))
+        return self._derived('_hierarchies', key, ContractionHierarchy.build)
+
+    def get_nearest_facilities(self, time_period, emergency_mode=False, facility_ids=()):
+        """Nearest-facility table of an already cached scenario graph, None if it is not cached"""
+        facility_ids = tuple(sorted(str(f).strip() for f in facility_ids))
+        key = (time_period.lower(), bool(emergency_mode), facility_ids)
+        return self._derived('_nearest', key, lambda graph: NearestFacilityTable.build(graph, facility_ids))
+
+    def _derived(self, table_name, key, build):
+        """Cached value built from the scenario graph key[:2], built outside the shared lock
+
+        A per-key lock lets one caller build while the others for that key wait and
+        every other key, including plain get() hits, goes on. A build that overlaps an
+        update_traffic patch of its graph is thrown away and redone.
+        """
+        with self._lock:
+            if self._graphs.get(key[:2]) is None:
+                return None
+            value = getattr(self, table_name).get(key)
+            if value is not None:
+                return value
+            build_lock = self._build_locks.setdefault((table_name, key), threading.Lock())
+
+        with build_lock:
+            while True:
+                with self._lock:
+                    graph = self._graphs.get(key[:2])
+                    if graph is None:
+                        return None
+                    value = getattr(self, table_name).get(key)
+                    if value is not None:
+                        return value  # built by the caller that held build_lock before us
+                    version = graph.version
+
+                value = build(graph)
+
+                with self._lock:
+                    if self._graphs.get(key[:2]) is graph and graph.version == version:
+                        getattr(self, table_name)[key] = value
+                        return value
+                    if self._graphs.get(key[:2]) is not graph:
+                        return None  # invalidated while building
+                logger.info(f"Graph {key[:2]} changed while building {table_name[1:]}, rebuilding")
+
+    def update_traffic(self, changes):
+        """Patch new (fromid, toid, time_period, volume) counts into the cached graphs in place
+
+        Only scenarios whose period changed are touched: their graph version is bumped and
+        the landmark, hierarchy and nearest-facility tables derived from them are dropped.
+        Disk caches and travel-time matrices are keyed by graph fingerprint, so they go
+        stale on their own. Returns the number of changed edges per time period.
+        """
+        with self._lock:
+            if self._weights is None:
+                return {}
+            affected = self._weights.update_traffic(changes)
+            for key, graph in self._graphs.items():
+                edges = affected.get(key[0])
+                if not edges:
+                    continue
+                self._weights.patch_graph(graph, key[0], key[1], edges)
+                self._landmarks.pop(key, None)
+                self._hierarchies.pop(key, None)
+                for nearest_key in [k for k in self._nearest if k[:2] == key]:
+                    del self._nearest[nearest_key]
+            return {period: len(edges) for period, edges in affected.items()}
+
+    def invalidate(self):
+        """Drop every cached graph"""
+        with self._lock:
+            self._clear()
+            self._fingerprint = None
+
+    def stats(self):
+        """Hit/miss counters, the number of cached scenario graphs and the traffic version"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'graphs': len(self._graphs),
+                    'version': self._weights.version if self._weights is not None else 0}
+
+    def _clear(self):
+        self._weights = None
+        self._graphs = {}
+        self._landmarks = {}
+        self._hierarchies = {}
+        self._nearest = {}
@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import os
+import numpy as np
+from algorithms.graph_algorithms import dijkstra
+
+logger = logging.getLogger(__name__)
+
+LANDMARK_CACHE_DIR = os.path.join(".cache", "landmarks")
+
+class LandmarkTable:
+    """ALT lower bounds from landmark distances and the triangle inequality"""
+    def __init__(self, landmarks, forward, backward):
+        self.landmarks = np.asarray(landmarks, dtype=np.int64)
+        self.forward = forward    # (k, nodes) travel time landmark -> node
+        self.backward = backward  # (k, nodes) travel time node -> landmark
+
+    def heuristic(self, target):
+        """Lower bound on the travel time from every node to the target index"""
+        with np.errstate(invalid='ignore'):
+            # d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L);
+            # fmax keeps one bound when the other is inf - inf
+            bounds = np.fmax(
+                self.forward[:, target, None] - self.forward,
+                self.backward - self.backward[:, target, None]
+            )
+        bounds = np.nan_to_num(bounds, nan=0.0, neginf=0.0)
+        return np.maximum(bounds.max(axis=0, initial=0.0), 0.0)
+
+    def heuristic_from(self, source):
+        """Lower bound on the travel time from the source index to every node"""
+        with np.errstate(invalid='ignore'):
+            # d(s, v) >= d(L, v) - d(L, s) and d(s, v) >= d(s, L) - d(v, L)
+            bounds = np.fmax(
+                self.forward - self.forward[:, source, None],
+                self.backward[:, source, None] - self.backward
+            )
+        bounds = np.nan_to_num(bounds, nan=0.0, neginf=0.0)
+        return np.maximum(bounds.max(axis=0, initial=0.0), 0.0)
+
+    def save(self, path):
+        np.savez(path, landmarks=self.landmarks, forward=self.forward, backward=self.backward)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['landmarks'], data['forward'], data['backward'])
+
+def build_landmarks(graph, k=8, seeds=()):
+    """Pick k landmarks (seed nodes first, then farthest-point picks) and their distance tables"""
+    reverse = graph.reversed()
+    landmarks, forward, backward = [], [], []
+    # shortest forward distance from any chosen landmark, drives the farthest-point picks
+    nearest = np.full(len(graph), np.inf)
+
+    def add(landmark):
+        dist, _ = dijkstra(graph, [landmark])
+        landmarks.append(landmark)
+        forward.append(dist)
+        backward.append(dijkstra(reverse, [landmark])[0])
+        np.minimum(nearest, dist, out=nearest)
+
+    for seed in seeds:
+        if len(landmarks) >= k:
+            break
+        seed = str(seed).strip()
+        if seed in graph and graph.index(seed) not in landmarks:
+            add(graph.index(seed))
+
+    if not landmarks and len(graph):
+        dist, _ = dijkstra(graph, [0])
+        add(int(np.argmax(np.where(np.isfinite(dist), dist, -1))))
+
+    while len(landmarks) < min(k, len(graph)):
+        candidates = np.where(np.isfinite(nearest), nearest, -1)
+        farthest = int(np.argmax(candidates))
+        if candidates[farthest] <= 0:
+            break
+        add(farthest)
+
+    shape = (len(landmarks), len(graph))
+    return LandmarkTable(
+        landmarks,
+        np.array(forward, dtype=np.float64).reshape(shape),
+        np.array(backward, dtype=np.float64).reshape(shape)
+    )
+
+def load_landmarks(graph, k=8, seeds=(), cache_dir=LANDMARK_CACHE_DIR):
+    """Landmark table for a graph, read from or written to the on-disk cache"""
+    seed_key = ','.join(sorted(str(seed).strip() for seed in seeds))
+    seed_hash = hashlib.blake2b(seed_key.encode(), digest_size=4).hexdigest()
+    path = os.path.join(cache_dir, f"{graph.fingerprint()}_{k}_{seed_hash}.npz")
+    if os.path.exists(path):
+        try:
+            return LandmarkTable.load(path)
+        except Exception:
+            logger.exception(f"Unreadable landmark cache {path}, rebuilding")
+
+    table = build_landmarks(graph, k, seeds)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        table.save(path)
+    except OSError:
+        logger.exception("Could not write landmark cache")
+    logger.info(f"Built {len(table.landmarks)} landmarks for {len(graph)} nodes")
+    return table
@@ -0,0 +1,64 @@
+import logging
+import numpy as np
+import pandas as pd
+from algorithms.graph_algorithms import dijkstra
+
+logger = logging.getLogger(__name__)
+
+class NearestFacilityTable:
+    """Nearest facility, travel time and next hop for every node of a CompiledGraph"""
+    def __init__(self, node_ids, nearest, travel_time, next_hop):
+        self.node_ids = list(node_ids)
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.nearest = nearest          # facility node index, -1 if none is reachable
+        self.travel_time = travel_time  # inf if no facility is reachable
+        self.next_hop = next_hop        # -1 at facilities and unreachable nodes
+
+    @classmethod
+    def build(cls, graph, facility_ids):
+        """One multi-source Dijkstra from all facilities over the reversed graph"""
+        sources = [graph.index(str(f).strip()) for f in facility_ids if str(f).strip() in graph]
+        dist, pred = dijkstra(graph.reversed(), sources)
+
+        # pred on the reversed graph is the next hop towards the facility; pointer
+        # doubling follows it to the facility that seeded each search tree
+        nearest = np.where(pred >= 0, pred, np.arange(len(graph)))
+        while True:
+            jumped = nearest[nearest]
+            if np.array_equal(jumped, nearest):
+                break
+            nearest = jumped
+        nearest = np.where(np.isfinite(dist), nearest, -1)
+
+        logger.info(f"Nearest facility table: {len(sources)} facilities, "
+                    f"{int(np.isfinite(dist).sum())}/{len(graph)} nodes covered")
+        return cls(graph.node_ids, nearest, dist, pred)
+
+    def lookup(self, node_id):
+        """(facility_id, travel_time, next_hop_id) for a node, or (None, None, None)"""
+        i = self.node_index.get(str(node_id).strip())
+        if i is None or self.nearest[i] < 0:
+            return None, None, None
+        next_hop = self.next_hop[i]
+        return (self.node_ids[self.nearest[i]], float(self.travel_time[i]),
+                self.node_ids[next_hop] if next_hop >= 0 else None)
+
+    def path(self, node_id):
+        """Route to the nearest facility by following next hops, returns (path, travel_time)"""
+        i = self.node_index.get(str(node_id).strip())
+        if i is None or self.nearest[i] < 0:
+            return None, None
+        path = [i]
+        while self.next_hop[path[-1]] >= 0:
+            path.append(int(self.next_hop[path[-1]]))
+        return [self.node_ids[j] for j in path], float(self.travel_time[i])
+
+    def to_frame(self):
+        """Table view with one row per node"""
+        ids = np.array(self.node_ids + [None], dtype=object)
+        return pd.DataFrame({
+            'node': self.node_ids,
+            'nearest_facility': ids[self.nearest],
+            'travel_time': self.travel_time,
+            'next_hop': ids[self.next_hop]
+        })
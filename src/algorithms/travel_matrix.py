@@ -0,0 +1,131 @@
+"""All-pairs travel-time matrices per scenario, stored as memory-mapped .npy files
+
+Run from the src directory:
+    python -m algorithms.travel_matrix .cache/matrices --workers 8
+"""
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from algorithms.batch_routing import SharedGraph
+from algorithms.graph_algorithms import TIME_PERIODS, compute_road_weights, dijkstra
+
+logger = logging.getLogger(__name__)
+
+MATRIX_DIR = os.path.join(".cache", "matrices")
+MANIFEST = "manifest.json"
+
+def _scenario_name(time_period, emergency_mode):
+    return f"{time_period.lower()}_{'emergency' if emergency_mode else 'normal'}"
+
+def _fill_rows(spec, time_path, pred_path, sources):
+    """Worker task: one Dijkstra per source, written straight into the memory-mapped rows"""
+    graph = SharedGraph.attach(spec)
+    times = np.load(time_path, mmap_mode='r+')
+    preds = np.load(pred_path, mmap_mode='r+')
+    for source in sources:
+        times[source], preds[source] = dijkstra(graph, [source])
+    times.flush()
+    preds.flush()
+    return len(sources)
+
+class TravelTimeMatrices:
+    """Read-only node x node travel-time and predecessor matrices for each scenario
+
+    The matrices are opened with mmap_mode='r', so every process that opens the
+    same directory shares the page cache instead of holding its own copy.
+    """
+    def __init__(self, directory, node_ids, scenarios):
+        self.directory = directory
+        self.node_ids = list(node_ids)
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.scenarios = scenarios  # scenario name -> (times, preds, graph fingerprint)
+
+    @classmethod
+    def build(cls, road_weights, directory=MATRIX_DIR, time_periods=TIME_PERIODS,
+              emergency_modes=(False, True), workers=None, chunk_size=64):
+        """Repeated Dijkstra over every scenario graph in parallel, rows written to .npy memmaps"""
+        os.makedirs(directory, exist_ok=True)
+        n = len(road_weights.node_ids)
+        manifest = {'node_ids': list(road_weights.node_ids), 'scenarios': {}}
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for time_period in time_periods:
+                for emergency_mode in emergency_modes:
+                    graph = road_weights.graph(time_period, emergency_mode)
+                    name = _scenario_name(time_period, emergency_mode)
+                    time_path = os.path.join(directory, f"{name}_time.npy")
+                    pred_path = os.path.join(directory, f"{name}_pred.npy")
+                    np.lib.format.open_memmap(time_path, mode='w+', dtype=np.float64, shape=(n, n)).flush()
+                    np.lib.format.open_memmap(pred_path, mode='w+', dtype=np.int32, shape=(n, n)).flush()
+
+                    shared = SharedGraph(graph)
+                    try:
+                        futures = [pool.submit(_fill_rows, shared.spec, time_path, pred_path,
+                                               range(i, min(i + chunk_size, n)))
+                                   for i in range(0, n, chunk_size)]
+                        for future in as_completed(futures):
+                            future.result()
+                    finally:
+                        shared.close()
+
+                    manifest['scenarios'][name] = graph.fingerprint()
+                    logger.info(f"Travel-time matrix {name}: {n}x{n}")
+
+        with open(os.path.join(directory, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+        return cls.open(directory)
+
+    @classmethod
+    def open(cls, directory=MATRIX_DIR):
+        """Memory-map previously built matrices"""
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        scenarios = {}
+        for name, fingerprint in manifest['scenarios'].items():
+            scenarios[name] = (
+                np.load(os.path.join(directory, f"{name}_time.npy"), mmap_mode='r'),
+                np.load(os.path.join(directory, f"{name}_pred.npy"), mmap_mode='r'),
+                fingerprint
+            )
+        return cls(directory, manifest['node_ids'], scenarios)
+
+    def is_current(self, graph, time_period, emergency_mode=False):
+        """Whether the stored scenario was built from exactly this graph"""
+        scenario = self.scenarios.get(_scenario_name(time_period, emergency_mode))
+        return scenario is not None and scenario[2] == graph.fingerprint()
+
+    def travel_time(self, u, v, time_period, emergency_mode=False):
+        """O(1) travel time between two node IDs, inf if unreachable"""
+        times, _, _ = self.scenarios[_scenario_name(time_period, emergency_mode)]
+        return float(times[self.node_index[str(u).strip()], self.node_index[str(v).strip()]])
+
+    def path(self, u, v, time_period, emergency_mode=False):
+        """Shortest path between two node IDs from the predecessor matrix, None if unreachable"""
+        times, preds, _ = self.scenarios[_scenario_name(time_period, emergency_mode)]
+        source, current = self.node_index[str(u).strip()], self.node_index[str(v).strip()]
+        if not np.isfinite(times[source, current]):
+            return None
+        row = preds[source]
+        path = [current]
+        while current != source:
+            current = int(row[current])
+            path.append(current)
+        return [self.node_ids[i] for i in reversed(path)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', nargs='?', default=MATRIX_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from utils.database import load_data
+    (_, _, existing_roads, potential_roads, _, _, _, traffic_flow) = load_data()
+    road_weights = compute_road_weights(existing_roads, traffic_flow, potential_roads)
+    TravelTimeMatrices.build(road_weights, args.directory, workers=args.workers)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Query latency of ContractionHierarchy.query against a_star on synthetic grids
+
+Run from the src directory:
+    python -m benchmarks.contraction_hierarchies_benchmark --sizes 50,100,500
+
+A side of 500 gives a grid of about 1M directed edges. Preprocessing is pure
+Python, so expect the largest grids to take a long time to contract.
+"""
+import argparse
+import logging
+import time
+import numpy as np
+from algorithms.compiled_graph import CompiledGraph
+from algorithms.contraction_hierarchies import ContractionHierarchy
+from algorithms.graph_algorithms import a_star
+from utils.helpers import haversine_vector
+
+def grid_graph(side, seed=0):
+    """Square grid with asymmetric random travel times, returns (graph, locations)"""
+    rng = np.random.default_rng(seed)
+    index = np.arange(side * side).reshape(side, side)
+    horizontal = np.stack([index[:, :-1].ravel(), index[:, 1:].ravel()], axis=1)
+    vertical = np.stack([index[:-1, :].ravel(), index[1:, :].ravel()], axis=1)
+    pairs = np.concatenate([horizontal, vertical])
+    sources = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    targets = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    rows, cols = np.divmod(np.arange(side * side), side)
+    lon, lat = 31.0 + 0.001 * cols, 30.0 + 0.001 * rows
+    # hours at 15-50 km/h, keeps a_star's 50 km/h haversine heuristic admissible
+    distance = haversine_vector(lon[sources], lat[sources], lon[targets], lat[targets])
+    weights = distance / rng.uniform(15, 50, len(sources))
+
+    node_ids = [str(i) for i in range(side * side)]
+    locations = dict(zip(node_ids, zip(lon.tolist(), lat.tolist())))
+    return CompiledGraph.from_edges(node_ids, sources, targets, weights), locations
+
+def run(side, queries, seed=0):
+    graph, locations = grid_graph(side, seed)
+    started = time.perf_counter()
+    hierarchy = ContractionHierarchy.build(graph)
+    preprocessing = time.perf_counter() - started
+
+    rng = np.random.default_rng(seed + 1)
+    pairs = [(graph.node_ids[s], graph.node_ids[t]) for s, t in rng.integers(0, len(graph), (queries, 2))]
+
+    a_star_time = ch_time = 0.0
+    for start, end in pairs:
+        started = time.perf_counter()
+        _, expected = a_star(graph, start, end, locations)
+        a_star_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, cost = hierarchy.query(start, end)
+        ch_time += time.perf_counter() - started
+
+        if not np.isclose(cost, expected):
+            raise AssertionError(f"Cost mismatch {start} -> {end}: {cost} != {expected}")
+
+    return {
+        'side': side,
+        'edges': graph.num_edges,
+        'preprocessing_s': preprocessing,
+        'a_star_ms': 1000 * a_star_time / queries,
+        'ch_ms': 1000 * ch_time / queries,
+        'speedup': a_star_time / ch_time if ch_time else float('inf')
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='50,100', help='comma separated grid sides (500 is ~1M edges)')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'side':>6} {'edges':>9} {'preproc s':>10} {'a_star ms':>10} {'ch ms':>8} {'speedup':>8}")
+    for side in map(int, args.sizes.split(',')):
+        r = run(side, args.queries, args.seed)
+        print(f"{r['side']:>6} {r['edges']:>9} {r['preprocessing_s']:>10.1f} "
+              f"{r['a_star_ms']:>10.2f} {r['ch_ms']:>8.3f} {r['speedup']:>8.1f}")
+
+if __name__ == '__main__':
+    main()
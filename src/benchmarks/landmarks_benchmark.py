@@ -0,0 +1,99 @@
+"""Consistency and query cost of ALT landmark bounds on grids with one-way streets
+
+Run from the src directory:
+    python -m benchmarks.landmarks_benchmark --sizes 30,100
+
+Dropping one direction of some streets makes reachability asymmetric, so some
+landmark distance tables hold inf where their reverse counterparts do not.
+"""
+import argparse
+import logging
+import time
+import numpy as np
+from algorithms.compiled_graph import CompiledGraph
+from algorithms.graph_algorithms import a_star, dijkstra
+from algorithms.landmarks import build_landmarks
+from benchmarks.contraction_hierarchies_benchmark import grid_graph
+
+def one_way_grid(side, one_way=0.3, seed=0):
+    """grid_graph with one_way of its directed edges removed, returns (graph, locations)"""
+    graph, locations = grid_graph(side, seed)
+    keep = np.random.default_rng(seed + 2).random(graph.num_edges) >= one_way
+    graph = CompiledGraph.from_edges(graph.node_ids, graph.edge_sources()[keep],
+                                     graph.targets[keep], graph.weights[keep])
+    return graph, locations
+
+def check_consistency(graph, table, target, source):
+    """Raise if either landmark bound breaks h(u) <= w(u, v) + h(v) on an edge that can reach target"""
+    sources = graph.edge_sources()
+    h = table.heuristic(target)
+    reaches = np.isfinite(dijkstra(graph.reversed(), [target])[0])[graph.targets]
+    slack = graph.weights + h[graph.targets] - h[sources]
+    if (reaches & (slack < -1e-9)).any():
+        raise AssertionError(f"Inconsistent heuristic towards {graph.node_ids[target]}")
+
+    # heuristic_from bounds the distance from source, so the edge inequality runs the other way
+    h = table.heuristic_from(source)
+    reached = np.isfinite(dijkstra(graph, [source])[0])[sources]
+    slack = graph.weights + h[sources] - h[graph.targets]
+    if (reached & (slack < -1e-9)).any():
+        raise AssertionError(f"Inconsistent reverse heuristic from {graph.node_ids[source]}")
+
+def run(side, queries, k=8, seed=0):
+    graph, locations = one_way_grid(side, seed=seed)
+    started = time.perf_counter()
+    table = build_landmarks(graph, k)
+    preprocessing = time.perf_counter() - started
+
+    rng = np.random.default_rng(seed + 1)
+    a_star_time = alt_time = 0.0
+    a_star_settled = alt_settled = 0
+    for s, t in rng.integers(0, len(graph), (queries, 2)).tolist():
+        check_consistency(graph, table, t, s)
+        start, end = graph.node_ids[s], graph.node_ids[t]
+        expected = dijkstra(graph, [s])[0][t]
+
+        stats = {}
+        started = time.perf_counter()
+        _, cost = a_star(graph, start, end, locations, stats=stats)
+        a_star_time += time.perf_counter() - started
+        a_star_settled += stats['settled']
+
+        for bidirectional in (False, True):
+            stats = {}
+            started = time.perf_counter()
+            _, alt_cost = a_star(graph, start, end, locations, landmarks=table, stats=stats,
+                                 bidirectional=bidirectional)
+            alt_time += time.perf_counter() - started
+            alt_settled += stats['settled']
+            for found in (cost, alt_cost):
+                if (found is None) != (not np.isfinite(expected)) or (found is not None and not np.isclose(found, expected)):
+                    raise AssertionError(f"Cost mismatch {start} -> {end}: {found} != {expected}")
+
+    return {
+        'side': side,
+        'edges': graph.num_edges,
+        'preprocessing_s': preprocessing,
+        'a_star_ms': 1000 * a_star_time / queries,
+        'alt_ms': 1000 * alt_time / (2 * queries),
+        'a_star_settled': a_star_settled / queries,
+        'alt_settled': alt_settled / (2 * queries)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='30,100', help='comma separated grid sides')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--landmarks', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f"{'side':>6} {'edges':>9} {'preproc s':>10} {'a_star ms':>10} {'alt ms':>8} {'a_star settled':>15} {'alt settled':>12}")
+    for side in map(int, args.sizes.split(',')):
+        r = run(side, args.queries, args.landmarks, args.seed)
+        print(f"{r['side']:>6} {r['edges']:>9} {r['preprocessing_s']:>10.1f} {r['a_star_ms']:>10.2f} "
+              f"{r['alt_ms']:>8.2f} {r['a_star_settled']:>15.0f} {r['alt_settled']:>12.0f}")
+
+if __name__ == '__main__':
+    main()
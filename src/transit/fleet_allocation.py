@@ -0,0 +1,51 @@
+import heapq
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# hours of the day covered by each Traffic_Flow period, in TIME_PERIODS order
+PERIOD_HOURS = {'morning_peak': 4, 'afternoon': 6, 'evening_peak': 4, 'night': 10}
+
+def allocate_fleet(loads, cycle_times, fleet_size, period_hours=None, bus_hours=None):
+    """Greedy bus allocation per (route, period) minimising total passenger waiting time
+
+    loads is a (routes, periods) array of boarding passengers and cycle_times the round-trip
+    minutes per route. With b buses a route runs every cycle / b minutes, so its waiting cost
+    is load * cycle / (2 * b), which is convex in b. No period may run more than fleet_size
+    buses. With period_hours and a bus_hours budget, a bus in period p uses period_hours[p]
+    of the shared budget, so the periods compete for it and each next bus goes to the largest
+    saving per bus-hour. Without a budget the periods are independent and each may use the
+    whole fleet. Every served (route, period) gets its first bus before any gets a second
+    one, in order of load * cycle per hour.
+    """
+    loads = np.asarray(loads, dtype=np.float64)
+    cycle_times = np.asarray(cycle_times, dtype=np.float64)
+    routes, periods = loads.shape
+    hours = np.ones(periods) if period_hours is None else np.asarray(period_hours, dtype=np.float64)
+    budget = np.inf if bus_hours is None else float(bus_hours)
+    buses = np.zeros((routes, periods), dtype=np.int64)
+    free = np.full(periods, int(fleet_size), dtype=np.int64)
+    weight = loads * cycle_times[:, None] / 2 / hours  # waiting cost per bus-hour with a single bus
+
+    def priority(r, p):
+        b = buses[r, p]
+        if b == 0:
+            return (0, -weight[r, p])
+        return (1, -weight[r, p] / (b * (b + 1)))
+
+    # one live entry per (route, period); only the entry that just got a bus is re-evaluated
+    open_heap = [priority(r, p) + (r, p) for r, p in zip(*np.nonzero(weight > 0))]
+    heapq.heapify(open_heap)
+    while open_heap and free.any():
+        _, _, r, p = heapq.heappop(open_heap)
+        if not free[p] or hours[p] > budget:
+            continue  # period full or no longer affordable, the budget only shrinks
+        buses[r, p] += 1
+        free[p] -= 1
+        budget -= hours[p]
+        heapq.heappush(open_heap, priority(r, p) + (r, p))
+
+    logger.info(f"Fleet allocation: {int(buses.sum())} bus-periods, {float((buses * hours).sum()):.0f} bus-hours "
+                f"over {routes} routes")
+    return buses
@@ -0,0 +1,256 @@
+import heapq
+import logging
+import numpy as np
+from utils.helpers import calculate_travel_time
+from algorithms.compiled_graph import CompiledGraph
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_TIME = 5      # minutes to walk between a metro station and a nearby bus stop
+METRO_HEADWAY = 5      # minutes between metro trains
+BUS_HEADWAY = 15       # minutes between buses when a route has no buses_assigned
+METRO_TRAFFIC_FACTOR = 0.8
+
+def _line_stops(value):
+    return [s.strip() for s in value.split(',')] if isinstance(value, str) else [str(s).strip() for s in value]
+
+class RaptorNetwork:
+    """Route and stop arrays for round-based (RAPTOR-style) queries on a frequency-based network
+
+    Every bus route and metro line is stored once per direction. route_stops[route_offsets[r]:
+    route_offsets[r + 1]] are the stop indices of route r, and hop_times at the same positions
+    hold the ride time to the next stop. Boarding costs half the route headway on average.
+    """
+    def __init__(self, stop_ids, route_lines, route_offsets, route_stops, hop_times, headways, transfers):
+        self.stop_ids = list(stop_ids)
+        self.stop_index = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        self.route_lines = list(route_lines)
+        self.route_offsets = route_offsets
+        self.route_stops = route_stops
+        self.hop_times = hop_times
+        self.headways = headways
+        self.transfers = transfers  # stop index -> [(stop index, minutes)]
+        self._waits = (headways / 2).tolist()
+
+        # per-stop (route, position) lists and per-route Python lists for the scan loop
+        offsets, stops, hops = route_offsets.tolist(), route_stops.tolist(), hop_times.tolist()
+        self._routes = [(stops[lo:hi], hops[lo:hi]) for lo, hi in zip(offsets[:-1], offsets[1:])]
+        self._stop_routes = [[] for _ in self.stop_ids]
+        for r, (route, _) in enumerate(self._routes):
+            for position, stop in enumerate(route):
+                self._stop_routes[stop].append((r, position))
+
+    @classmethod
+    def build(cls, bus_routes, metro_lines, registry, connections, metro_headway=METRO_HEADWAY):
+        """Route arrays from Bus_Routes.stops and Metro_Lines.stations, transfers from identify_transfer_points"""
+        lines = []
+        for _, route in bus_routes.iterrows():
+            stops = _line_stops(route['stops'])
+            hops = [calculate_travel_time(a, b, None, None, registry=registry) for a, b in zip(stops[:-1], stops[1:])]
+            # buses run evenly spaced around the round trip
+            buses = route.get('buses_assigned', 0)
+            headway = 2 * sum(hops) / buses if buses and buses > 0 else BUS_HEADWAY
+            lines.append((str(route.get('routeid', len(lines))), stops, hops, headway))
+        for _, line in metro_lines.iterrows():
+            stations = _line_stops(line['stations'])
+            hops = [calculate_travel_time(a, b, None, None, METRO_TRAFFIC_FACTOR, registry=registry)
+                    for a, b in zip(stations[:-1], stations[1:])]
+            lines.append((str(line.get('lineid', len(lines))), stations, hops, metro_headway))
+
+        stop_index = {}
+        route_lines, route_offsets, route_stops, hop_times, headways = [], [0], [], [], []
+        for line_id, stops, hops, headway in lines:
+            for direction_stops, direction_hops in ((stops, hops), (stops[::-1], hops[::-1])):
+                route_lines.append(line_id)
+                route_stops.extend(stop_index.setdefault(s, len(stop_index)) for s in direction_stops)
+                hop_times.extend(direction_hops + [0.0])
+                route_offsets.append(len(route_stops))
+                headways.append(headway)
+
+        transfers = {}
+        for stop, nearby in connections.items():
+            stop = str(stop).strip()
+            if stop not in stop_index:
+                continue
+            transfers[stop_index[stop]] = [(stop_index[str(n).strip()], TRANSFER_TIME)
+                                           for n in nearby if str(n).strip() in stop_index]
+
+        logger.info(f"RAPTOR network: {len(stop_index)} stops, {len(route_lines)} directed routes")
+        return cls(list(stop_index), route_lines,
+                   np.array(route_offsets, dtype=np.int64), np.array(route_stops, dtype=np.int64),
+                   np.array(hop_times, dtype=np.float64), np.array(headways, dtype=np.float64), transfers)
+
+    def line_stop_graph(self):
+        """Transfer-aware CompiledGraph with one node per stop and one per (directed route, stop)
+
+        Stop nodes come first and keep the stop ids; route position p becomes node
+        len(stop_ids) + p with id (line_id, stop_id, p). Boarding edges cost half the
+        headway, ride edges the hop time, alighting is free and walking transfers link
+        stop nodes, so changing lines is priced while riding through a stop is not.
+        """
+        n = len(self.stop_ids)
+        positions = np.arange(len(self.route_stops), dtype=np.int64)
+        routes = np.repeat(np.arange(len(self.route_lines)), np.diff(self.route_offsets))
+        riding = np.ones(len(positions), dtype=bool)
+        riding[self.route_offsets[1:] - 1] = False  # no ride out of the last stop
+
+        walk_from, walk_to, walk_minutes = [], [], []
+        for stop, nearby in self.transfers.items():
+            for other, minutes in nearby:
+                walk_from.append(stop)
+                walk_to.append(other)
+                walk_minutes.append(minutes)
+
+        sources = np.concatenate([self.route_stops, n + positions, n + positions[riding],
+                                  np.array(walk_from, dtype=np.int64)])
+        targets = np.concatenate([n + positions, self.route_stops, n + positions[riding] + 1,
+                                  np.array(walk_to, dtype=np.int64)])
+        weights = np.concatenate([
+            self.headways[routes] / 2,
+            np.zeros(len(positions)),
+            self.hop_times[riding],
+            np.array(walk_minutes, dtype=np.float64)
+        ])
+        node_ids = self.stop_ids + [(self.route_lines[r], self.stop_ids[s], p)
+                                    for p, (r, s) in enumerate(zip(routes.tolist(), self.route_stops.tolist()))]
+        return CompiledGraph.from_edges(node_ids, sources, targets, weights)
+
+    def query(self, origin, destination, max_transfers=2, departure=0.0):
+        """Pareto-optimal journeys by (arrival, transfers), fewest transfers first
+
+        Each journey is {'arrival', 'travel_time', 'transfers', 'legs', 'path'} where legs
+        are (line_id, from_stop, to_stop), walking transfers use line_id 'transfer', and
+        path lists every stop passed.
+        """
+        origin, destination = str(origin).strip(), str(destination).strip()
+        if origin not in self.stop_index or destination not in self.stop_index or origin == destination:
+            return []
+        source, target = self.stop_index[origin], self.stop_index[destination]
+        labels, parents = self._rounds(source, max_transfers, departure, target)
+
+        journeys = []
+        for k in range(1, len(labels)):
+            if labels[k][target] < labels[k - 1][target]:
+                journeys.append(self._journey(labels, parents, k, source, target, departure))
+        return journeys
+
+    def query_all(self, origin, destinations, max_transfers=2, departure=0.0):
+        """Fastest journey within max_transfers to each destination from one search, None if unreachable"""
+        origin = str(origin).strip()
+        if origin not in self.stop_index:
+            return {destination: None for destination in destinations}
+        source = self.stop_index[origin]
+        labels, parents = self._rounds(source, max_transfers, departure)
+
+        journeys = {}
+        for destination in destinations:
+            target = self.stop_index.get(str(destination).strip())
+            if target is None or target == source or labels[-1][target] == float('inf'):
+                journeys[destination] = None
+                continue
+            # the earliest round reaching the best arrival uses the fewest transfers
+            k = next(k for k in range(1, len(labels)) if labels[k][target] == labels[-1][target])
+            journeys[destination] = self._journey(labels, parents, k, source, target, departure)
+        return journeys
+
+    def _rounds(self, source, max_transfers, departure, target=None):
+        """Per-round arrival labels and parents; a target prunes arrivals later than its best"""
+        n = len(self.stop_ids)
+        best = [float('inf')] * n  # earliest arrival over all rounds, for pruning
+        labels = [[float('inf')] * n]
+        labels[0][source] = best[source] = departure
+        parents = [{}]
+        marked = self._relax_transfers(labels[0], best, parents[0], {source})
+
+        # round k rides k vehicles, so it ends with k - 1 transfers
+        for k in range(1, max_transfers + 2):
+            if not marked:
+                break
+            previous = labels[-1]
+            current = list(previous)
+            parent = {}
+
+            queue = {}
+            for stop in marked:
+                for r, position in self._stop_routes[stop]:
+                    if position < queue.get(r, len(self._routes[r][0])):
+                        queue[r] = position
+
+            marked = set()
+            for r, start in queue.items():
+                stops, hops = self._routes[r]
+                wait = self._waits[r]
+                arrival = float('inf')
+                board = -1
+                for position in range(start, len(stops)):
+                    stop = stops[position]
+                    if position > start:
+                        arrival += hops[position - 1]
+                    if arrival < best[stop] and (target is None or arrival < best[target]):
+                        current[stop] = best[stop] = arrival
+                        parent[stop] = (r, board)
+                        marked.add(stop)
+                    # catch the vehicle here if that beats staying on board from upstream
+                    if previous[stop] + wait < arrival:
+                        arrival = previous[stop] + wait
+                        board = position
+
+            marked = self._relax_transfers(current, best, parent, marked)
+            labels.append(current)
+            parents.append(parent)
+        return labels, parents
+
+    def _journey(self, labels, parents, k, source, target, departure):
+        legs, path = self._legs(parents, k, source, target)
+        return {
+            'arrival': labels[k][target],
+            'travel_time': labels[k][target] - departure,
+            'transfers': k - 1,
+            'legs': legs,
+            'path': path
+        }
+
+    def _relax_transfers(self, label, best, parent, marked):
+        """Walking transfers out of the stops improved in this round, chained walks included
+
+        RAPTOR needs transitively closed footpaths, so this is a small Dijkstra over the
+        transfer links seeded with the improved stops.
+        """
+        improved = set(marked)
+        open_heap = [(label[stop], stop) for stop in marked]
+        heapq.heapify(open_heap)
+        while open_heap:
+            minute, stop = heapq.heappop(open_heap)
+            if minute > label[stop]:
+                continue
+            for nearby, minutes in self.transfers.get(stop, ()):
+                if minute + minutes < best[nearby]:
+                    label[nearby] = best[nearby] = minute + minutes
+                    parent[nearby] = (-1, stop)
+                    improved.add(nearby)
+                    heapq.heappush(open_heap, (minute + minutes, nearby))
+        return improved
+
+    def _legs(self, parents, k, source, target):
+        legs = []
+        path = [target]
+        stop = target
+        while stop != source:
+            if stop not in parents[k]:
+                k -= 1  # label carried over from an earlier round
+                continue
+            r, origin = parents[k][stop]
+            if r < 0:
+                legs.append(('transfer', self.stop_ids[origin], self.stop_ids[stop]))
+                path.append(origin)
+                stop = origin
+            else:
+                stops = self._routes[r][0]
+                alight = stops.index(stop, origin + 1)
+                legs.append((self.route_lines[r], self.stop_ids[stops[origin]], self.stop_ids[stop]))
+                path.extend(reversed(stops[origin:alight]))
+                stop = stops[origin]
+                k -= 1
+        legs.reverse()
+        path.reverse()
+        return legs, [self.stop_ids[stop] for stop in path]
@@ -1,46 +1,10 @@
 import math
+import numpy as np
 import pandas as pd
-from collections import defaultdict
-from typing import Dict, List, Tuple
-from utils.helpers import get_coordinates, calculate_travel_time
-from algorithms.graph_algorithms import identify_transfer_points
-
-class RouteOptimizer:
-    def __init__(self, graph, demands):
-        self.graph = graph
-        self.demands = demands
-        self.memo = {}
-
-    def find_optimal_path(self, origin, destination, max_stops=3):
-        """Find the optimal path using memoization"""
-        def dp(current, time, stops, visited):
-            if current == destination:
-                return (time, [current])
-            if stops == 0:
-                return (float('inf'), [])
-            
-            key = (current, stops)
-            if key in self.memo:
-                return self.memo[key]
-            
-            min_time = float('inf')
-            best_path = []
-            for neighbor, edge_time in self.graph[current].items():
-                if neighbor not in visited:
-                    new_time = time + edge_time
-                    new_visited = visited.copy()
-                    new_visited.add(neighbor)
-                    future_time, path = dp(neighbor, new_time, stops-1, new_visited)
-                    total_time = new_time + future_time
-                    
-                    if total_time < min_time:
-                        min_time = total_time
-                        best_path = [current] + path
-            
-            self.memo[key] = (min_time, best_path)
-            return (min_time, best_path)
-        
-        return dp(origin, 0, max_stops, set([origin]))
+from utils.node_registry import NodeRegistry
+from transit.raptor import RaptorNetwork
+from transit.fleet_allocation import PERIOD_HOURS, allocate_fleet
+from algorithms.graph_algorithms import TIME_PERIODS, identify_transfer_points, dijkstra
 
 class TransitOptimizer:
     def __init__(self, bus_routes, metro_lines, demand_data, traffic_flow, neighborhoods, facilities):
@@ -50,6 +14,7 @@ class TransitOptimizer:
         self.traffic_flow = traffic_flow.copy()
         self.neighborhoods = neighborhoods
         self.facilities = facilities
+        self.registry = NodeRegistry.from_tables(neighborhoods, facilities)
         
         if isinstance(self.bus_routes['stops'].iloc[0], str):
             self.bus_routes['stops'] = self.bus_routes['stops'].str.split(',')
@@ -59,62 +24,171 @@ class TransitOptimizer:
         self.demand_pairs = self.demand_data.set_index(['fromid', 'toid'])['daily_passengers']
         
         self.transfer_points, self.connections = identify_transfer_points(
-            self.bus_routes, self.metro_lines, self.neighborhoods, self.facilities)
-        self.transport_graph = self.build_transport_graph()
+            self.bus_routes, self.metro_lines, self.neighborhoods, self.facilities, registry=self.registry)
+        self.raptor = RaptorNetwork.build(self.bus_routes, self.metro_lines, self.registry, self.connections)
+        self.line_stop_graph = self.raptor.line_stop_graph()
 
-    def build_transport_graph(self):
-        """Build the transportation network graph"""
-        graph = defaultdict(dict)
-        
-        for _, route in self.bus_routes.iterrows():
-            stops = route['stops']
-            for i in range(len(stops)-1):
-                from_stop = stops[i]
-                to_stop = stops[i+1]
-                time = calculate_travel_time(from_stop, to_stop, 
-                                          self.neighborhoods, self.facilities)
-                graph[from_stop][to_stop] = time
-                graph[to_stop][from_stop] = time
-
-        for _, line in self.metro_lines.iterrows():
-            stations = line['stations']
-            for i in range(len(stations)-1):
-                from_station = stations[i]
-                to_station = stations[i+1]
-                time = calculate_travel_time(from_station, to_station,
-                                          self.neighborhoods, self.facilities,
-                                          traffic_factor=0.8)
-                graph[from_station][to_station] = time
-                graph[to_station][from_station] = time
-
-        for metro, buses in self.connections.items():
-            for bus in buses:
-                transfer_time = 5  # 5 minutes transfer time
-                graph[metro][bus] = transfer_time
-                graph[bus][metro] = transfer_time
-
-        return graph
-
-    def optimize_routes(self, threshold=30000):
-        """Optimize routes using dynamic programming"""
-        optimizer = RouteOptimizer(self.transport_graph, self.demand_pairs)
+    def optimize_routes(self, threshold=30000, max_transfers=2):
+        """Fastest line-aware journey with at most max_transfers transfers for the top demand pairs"""
         optimized_paths = []
         
         top_demands = self.demand_pairs.nlargest(10).index.tolist()
         
         for origin, destination in top_demands:
-            time, path = optimizer.find_optimal_path(str(origin), str(destination))
-            if time < float('inf'):
+            journeys = self.raptor.query(origin, destination, max_transfers)
+            if journeys:
+                fastest = journeys[-1]
                 optimized_paths.append({
                     'fromid': origin,
                     'toid': destination,
-                    'path': path,
-                    'estimated_time': time,
+                    'path': fastest['path'],
+                    'estimated_time': fastest['travel_time'],
+                    'transfers': fastest['transfers'],
                     'demand': self.demand_pairs[(origin, destination)]
                 })
         
         return pd.DataFrame(optimized_paths)
 
+    def optimize_all_routes(self, max_transfers=2):
+        """Route every Transportation_Demand row within max_transfers, one RAPTOR search per origin
+
+        Unreachable pairs keep an infinite time, an empty path and -1 transfers.
+        """
+        times = np.full(len(self.demand_data), np.inf)
+        transfers = np.full(len(self.demand_data), -1, dtype=np.int64)
+        paths = [[] for _ in range(len(self.demand_data))]
+        origins = self.demand_data['fromid'].astype(str).str.strip().to_numpy()
+        destinations = self.demand_data['toid'].astype(str).str.strip().to_numpy()
+
+        for origin in pd.unique(origins):
+            rows = np.flatnonzero(origins == origin)
+            journeys = self.raptor.query_all(origin, pd.unique(destinations[rows]), max_transfers)
+            for row in rows:
+                journey = journeys[destinations[row]]
+                if journey is not None:
+                    times[row] = journey['travel_time']
+                    transfers[row] = journey['transfers']
+                    paths[row] = journey['path']
+
+        passengers = self.demand_data['daily_passengers'].to_numpy(dtype=np.float64)
+        return pd.DataFrame({
+            'fromid': self.demand_data['fromid'].to_numpy(),
+            'toid': self.demand_data['toid'].to_numpy(),
+            'demand': self.demand_data['daily_passengers'].to_numpy(),
+            'estimated_time': times,
+            'transfers': transfers,
+            'path': paths,
+            'passenger_minutes': np.where(np.isfinite(times), passengers * times, np.nan)
+        })
+
+    def plan_journeys(self, origin, destination, max_transfers=2):
+        """Pareto-optimal (travel time, transfers) journeys on the line-aware RAPTOR network"""
+        return self.raptor.query(origin, destination, max_transfers)
+
+    def assign_demand(self):
+        """All-or-nothing assignment of every demand pair onto the line-stop graph
+
+        Runs one Dijkstra per origin stop. Returns (journeys, loads): travel time and
+        boardings per demand row, and passengers and boardings per ridden line segment.
+        """
+        graph = self.line_stop_graph
+        n_stops = len(self.raptor.stop_ids)
+        loads = np.zeros(len(graph))  # passengers riding out of each route position node
+        boarded = np.zeros(len(graph))  # passengers boarding at each route position node
+        times = np.full(len(self.demand_data), np.inf)
+        boardings = np.zeros(len(self.demand_data), dtype=np.int64)
+        origins = self.demand_data['fromid'].astype(str).str.strip().to_numpy()
+        destinations = self.demand_data['toid'].astype(str).str.strip().to_numpy()
+        passengers = self.demand_data['daily_passengers'].to_numpy(dtype=np.float64)
+
+        for origin in pd.unique(origins):
+            if origin not in graph:
+                continue
+            dist, pred = dijkstra(graph, [graph.index(origin)])
+            for row in np.flatnonzero(origins == origin):
+                if destinations[row] not in graph or not np.isfinite(dist[graph.index(destinations[row])]):
+                    continue
+                node = graph.index(destinations[row])
+                times[row] = dist[node]
+                while pred[node] >= 0:
+                    previous = int(pred[node])
+                    if previous >= n_stops and node >= n_stops:
+                        loads[previous] += passengers[row]
+                    elif previous < n_stops <= node:
+                        boardings[row] += 1
+                        boarded[node] += passengers[row]
+                    node = previous
+
+        journeys = pd.DataFrame({
+            'fromid': self.demand_data['fromid'].to_numpy(),
+            'toid': self.demand_data['toid'].to_numpy(),
+            'demand': self.demand_data['daily_passengers'].to_numpy(),
+            'travel_time': times,
+            'boardings': boardings
+        })
+        ridden = np.flatnonzero(loads[n_stops:] > 0)
+        segment_ids = [graph.node_ids[n_stops + p] for p in ridden.tolist()]
+        segment_ends = [graph.node_ids[n_stops + p + 1] for p in ridden.tolist()]
+        loads = pd.DataFrame({
+            'line': [line for line, _, _ in segment_ids],
+            'from_stop': [stop for _, stop, _ in segment_ids],
+            'to_stop': [stop for _, stop, _ in segment_ends],
+            'passengers': loads[n_stops + ridden],
+            'boardings': boarded[n_stops + ridden]
+        })
+        return journeys, loads
+
+    def allocate_fleet(self, fleet_size, duty_hours=16):
+        """Buses per bus route and period for a fleet budget, minimising passenger waiting time
+
+        Route loads are the assigned demand boardings, split over the periods by the
+        Traffic_Flow volumes on the route's own roads. The periods share one budget of
+        fleet_size * duty_hours bus-hours and none may run more than fleet_size buses.
+        """
+        _, segment_loads = self.assign_demand()
+        line_boardings = segment_loads.groupby('line')['boardings'].sum()
+        route_ids = self.bus_routes['routeid'].astype(str).str.strip().tolist()
+
+        route_lines = np.array(self.raptor.route_lines)
+        hop_sums = np.add.reduceat(self.raptor.hop_times, self.raptor.route_offsets[:-1])
+        cycle_times = np.array([hop_sums[route_lines == line].sum() for line in route_ids])
+
+        loads = line_boardings.reindex(route_ids, fill_value=0).to_numpy()[:, None] * self.route_period_shares()
+        period_hours = [PERIOD_HOURS[period] for period in TIME_PERIODS]
+        buses = allocate_fleet(loads, cycle_times, fleet_size, period_hours, fleet_size * duty_hours)
+        with np.errstate(divide='ignore'):
+            headways = np.where(buses > 0, cycle_times[:, None] / buses, np.inf)
+        return pd.DataFrame({
+            'routeid': np.repeat(route_ids, len(TIME_PERIODS)),
+            'period': np.tile(TIME_PERIODS, len(route_ids)),
+            'passengers': loads.ravel(),
+            'buses': buses.ravel(),
+            'headway': headways.ravel(),
+            'expected_wait': headways.ravel() / 2
+        })
+
+    def route_period_shares(self):
+        """(routes, periods) share of each bus route's daily traffic per period
+
+        Sums the Traffic_Flow counts of the roads between consecutive stops, in either
+        direction. Routes without any counted road fall back to the city-wide shares.
+        """
+        flow = self.traffic_flow.assign(
+            fromid=self.traffic_flow['fromid'].astype(str).str.strip(),
+            toid=self.traffic_flow['toid'].astype(str).str.strip())
+        volumes = pd.concat([flow, flow.rename(columns={'fromid': 'toid', 'toid': 'fromid'})])
+        volumes = volumes.groupby(['fromid', 'toid'])[TIME_PERIODS].max()
+
+        city = self.traffic_flow[TIME_PERIODS].sum().to_numpy(dtype=np.float64)
+        shares = np.tile(city / city.sum(), (len(self.bus_routes), 1))
+        for i, stops in enumerate(self.bus_routes['stops']):
+            stops = [str(s).strip() for s in stops]
+            pairs = volumes.index.intersection(pd.MultiIndex.from_arrays([stops[:-1], stops[1:]]))
+            route = volumes.loc[pairs].to_numpy(dtype=np.float64).sum(axis=0)
+            if route.sum() > 0:
+                shares[i] = route / route.sum()
+        return shares
+
     def calculate_buses_needed(self, capacity=50, trips_per_day=4, target_utilization=80):
         """Calculate the number of buses needed"""
         total_demand = self.demand_data['daily_passengers'].sum()
@@ -136,3 +210,30 @@ class TransitOptimizer:
             schedule.append(math.ceil(buses))
         
         return schedule 
+
+    def sweep_fleet_scenarios(self, capacities, utilizations, trips_per_day=(4,)):
+        """Fleet size and per-period schedule over a capacity x utilization x trips x period grid
+
+        One NumPy broadcast with the same arithmetic as calculate_buses_needed and
+        optimize_schedule, returned as a tidy frame with one row per grid point.
+        """
+        capacity, utilization, trips, period = np.meshgrid(
+            np.asarray(capacities, dtype=np.float64),
+            np.asarray(utilizations, dtype=np.float64),
+            np.asarray(trips_per_day, dtype=np.float64),
+            np.arange(len(TIME_PERIODS)),
+            indexing='ij'
+        )
+        total_demand = self.demand_data['daily_passengers'].sum()
+        period_demand = self.traffic_flow[TIME_PERIODS].sum().to_numpy(dtype=np.float64)
+
+        buses_needed = np.ceil(total_demand / (capacity * trips * (utilization / 100)))
+        scheduled_buses = np.ceil(period_demand[period] / (capacity * (utilization / 100)))
+        return pd.DataFrame({
+            'capacity': capacity.ravel(),
+            'utilization': utilization.ravel(),
+            'trips_per_day': trips.ravel(),
+            'period': np.array(TIME_PERIODS)[period.ravel()],
+            'buses_needed': buses_needed.ravel().astype(np.int64),
+            'scheduled_buses': scheduled_buses.ravel().astype(np.int64)
+        })
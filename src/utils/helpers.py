@@ -1,4 +1,5 @@
 import math
+import numpy as np
 from geopy.distance import geodesic
 
 def haversine(lon1, lat1, lon2, lat2):
@@ -16,6 +17,17 @@ def haversine(lon1, lat1, lon2, lat2):
     
     return r * c
 
+def haversine_vector(lon1, lat1, lon2, lat2):
+    """Vectorized haversine distance in km over NumPy arrays (broadcasting)"""
+    lon1, lat1, lon2, lat2 = map(np.radians, [lon1, lat1, lon2, lat2])
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+    return 6371 * c
+
 def get_coordinates(id, neighborhoods, facilities):
     """Extract coordinates from tables"""
     if str(id).isdigit():
@@ -24,10 +36,14 @@ def get_coordinates(id, neighborhoods, facilities):
         df = facilities[facilities["id"] == id]
     return (float(df["x_coordinate"].values[0]), float(df["y_coordinate"].values[0]))
 
-def calculate_travel_time(start, end, neighborhoods, facilities, traffic_factor=1.0):
+def calculate_travel_time(start, end, neighborhoods, facilities, traffic_factor=1.0, registry=None):
     """Calculate travel time using geodesic distance"""
-    start_coord = get_coordinates(start, neighborhoods, facilities)
-    end_coord = get_coordinates(end, neighborhoods, facilities)
+    if registry is not None:
+        start_coord = registry.coordinates(start)
+        end_coord = registry.coordinates(end)
+    else:
+        start_coord = get_coordinates(start, neighborhoods, facilities)
+        end_coord = get_coordinates(end, neighborhoods, facilities)
     distance = geodesic(start_coord, end_coord).kilometers
     base_speed = 30  
     return (distance / (base_speed / traffic_factor)) * 60  
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+class NodeRegistry:
+    """Interned neighborhood and facility ids with contiguous lon/lat arrays, names and types"""
+    def __init__(self, node_ids, lon, lat, names, types):
+        self.node_ids = list(node_ids)
+        self._index = pd.Index(self.node_ids)
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.lon = np.ascontiguousarray(lon, dtype=np.float64)
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.names = list(names)
+        self.types = list(types)
+
+    @classmethod
+    def from_tables(cls, neighborhoods, facilities):
+        """Build once from the node tables, column names in any case; a later duplicate id wins"""
+        frames = []
+        for table in (neighborhoods, facilities):
+            table = table.rename(columns=str.lower)
+            frames.append(pd.DataFrame({
+                'id': table['id'].astype(str).str.strip(),
+                'name': table['name'] if 'name' in table.columns else table['id'],
+                'type': table['type'] if 'type' in table.columns else None,
+                'lon': table['x_coordinate'].astype(np.float64),
+                'lat': table['y_coordinate'].astype(np.float64)
+            }))
+        nodes = pd.concat(frames, ignore_index=True).drop_duplicates('id', keep='last')
+        return cls(nodes['id'], nodes['lon'].to_numpy(), nodes['lat'].to_numpy(), nodes['name'], nodes['type'])
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __contains__(self, node_id):
+        return str(node_id).strip() in self.node_index
+
+    def index(self, node_id):
+        """Interned integer index of a node ID"""
+        return self.node_index[str(node_id).strip()]
+
+    def indices(self, node_ids):
+        """Vectorized index lookup, -1 for unknown IDs"""
+        return self._index.get_indexer(pd.Index(node_ids).astype(str).str.strip())
+
+    def coordinates(self, node_id):
+        """(lon, lat) of a node ID"""
+        i = self.index(node_id)
+        return (float(self.lon[i]), float(self.lat[i]))
+
+    def coordinates_many(self, node_ids):
+        """(n, 2) array of lon/lat for a sequence of node IDs, NaN rows for unknown IDs"""
+        indices = self.indices(node_ids)  # -1 picks the appended NaN
+        return np.column_stack([np.append(self.lon, np.nan)[indices], np.append(self.lat, np.nan)[indices]])
+
+    def name(self, node_id):
+        return self.names[self.index(node_id)]
+
+    def locations(self):
+        """{node_id: (lon, lat)} mapping for code that works on plain dicts"""
+        return dict(zip(self.node_ids, zip(self.lon.tolist(), self.lat.tolist())))
@@ -0,0 +1,31 @@
+import math
+from collections import defaultdict
+import numpy as np
+
+# shortest length of one degree along either geodesic axis, in meters
+METERS_PER_DEGREE_LATITUDE = 110574
+METERS_PER_DEGREE_LONGITUDE = 111320
+
+def degrees_for_meters(meters, max_abs_latitude):
+    """Upper bound in degrees on either coordinate difference of two points closer than meters"""
+    meters_per_degree = min(METERS_PER_DEGREE_LATITUDE,
+                            METERS_PER_DEGREE_LONGITUDE * math.cos(math.radians(min(max_abs_latitude, 89.0))))
+    return meters / meters_per_degree
+
+class GridIndex:
+    """Uniform grid hash over 2D points for fixed-radius neighbour queries"""
+    def __init__(self, points, cell_size):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        for i, cell in enumerate(np.floor(self.points / cell_size).astype(np.int64).tolist()):
+            self.cells[tuple(cell)].append(i)
+
+    def candidates(self, point):
+        """Sorted indices of the points within cell_size of point along both axes, plus some farther ones"""
+        cx, cy = (int(c) for c in np.floor(np.asarray(point, dtype=np.float64) / self.cell_size))
+        found = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                found.extend(self.cells.get((cx + dx, cy + dy), ()))
+        return sorted(found)
@@ -1,55 +1,38 @@
 import streamlit as st
 import pydeck as pdk
+import numpy as np
 import pandas as pd
 from geopy.distance import geodesic
 
-def prepare_road_data(roads, neighborhoods, facilities, locations):
+def prepare_road_data(roads, registry):
     """Prepare road data for visualization"""
-    road_segments = []
+    start = registry.coordinates_many(roads['fromid'])
+    end = registry.coordinates_many(roads['toid'])
+    known = ~(np.isnan(start).any(axis=1) | np.isnan(end).any(axis=1))
     
-    for _, road in roads.iterrows():
-        from_id = str(road['fromid']).strip()
-        to_id = str(road['toid']).strip()
-        
-        if from_id in locations and to_id in locations:
-            road_segments.append({
-                'start_lon': locations[from_id][0],
-                'start_lat': locations[from_id][1],
-                'end_lon': locations[to_id][0],
-                'end_lat': locations[to_id][1],
-                'road_type': 'existing'
-            })
-    
-    return pd.DataFrame(road_segments)
+    return pd.DataFrame({
+        'start_lon': start[known, 0],
+        'start_lat': start[known, 1],
+        'end_lon': end[known, 0],
+        'end_lat': end[known, 1],
+        'road_type': 'existing'
+    })
 
-def prepare_lines_df(edges, neighborhoods, facilities):
+def prepare_lines_df(edges, registry):
     """Prepare line data for pydeck visualization"""
-    lines = []
-    nodes_df = pd.concat([
-        neighborhoods.rename(columns={'id': 'nodeid'}),
-        facilities.rename(columns={'id': 'nodeid'})
-    ], ignore_index=True)
-    nodes_df['nodeid'] = nodes_df['nodeid'].astype(str)
-    nodes_df.set_index('nodeid', inplace=True)
-
-    for u, v, data in edges:
-        try:
-            start_lat = float(nodes_df.loc[u]['y_coordinate'])
-            start_lon = float(nodes_df.loc[u]['x_coordinate'])
-            end_lat = float(nodes_df.loc[v]['y_coordinate'])
-            end_lon = float(nodes_df.loc[v]['x_coordinate'])
-        except KeyError:
-            continue
+    edges = list(edges)
+    start = registry.coordinates_many([u for u, _, _ in edges])
+    end = registry.coordinates_many([v for _, v, _ in edges])
+    known = ~(np.isnan(start).any(axis=1) | np.isnan(end).any(axis=1))
 
-        lines.append({
-            'start_lat': start_lat,
-            'start_lon': start_lon,
-            'end_lat': end_lat,
-            'end_lon': end_lon,
-            'weight': data.get('weight', 1),
-            'road_type': data.get('road_type', 'existing')
-        })
-    return pd.DataFrame(lines)
+    return pd.DataFrame({
+        'start_lat': start[known, 1],
+        'start_lon': start[known, 0],
+        'end_lat': end[known, 1],
+        'end_lon': end[known, 0],
+        'weight': [data.get('weight', 1) for (_, _, data), k in zip(edges, known) if k],
+        'road_type': [data.get('road_type', 'existing') for (_, _, data), k in zip(edges, known) if k]
+    })
 
 def visualize_map(neighborhoods, facilities, roads_df=None, path=None, transfer_points=None, 
                  view_type="Standard Map", mst_edges_df=None, locations=None):